@@ -0,0 +1,62 @@
+"""
+The scripts as a package, e.g. for scheduled jobs:
+
+    from scripts import load_parameters, simulate_parallel
+
+Importing the package itself is (nearly) free: a name is imported from its module on first use, so a job only pays
+for the dependencies (pandas, scipy, matplotlib) of the functions it uses. The modules import each other by name,
+like the notebooks do after sys.path.append('../scripts'), so this folder is added to sys.path as well.
+There are no submodules: a module is only imported by its own name ('import simulate', never 'scripts.simulate'),
+so every module is loaded once and module state such as the instrumentation and the caches is shared.
+"""
+import importlib
+import os
+import sys
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SCRIPTS_DIR not in sys.path:
+    sys.path.append(_SCRIPTS_DIR)
+
+# No submodules: 'import scripts.simulate' would load simulate.py a second time as another module
+__path__ = []
+
+# Module of every public name
+_EXPORTS = {
+    'cars': ['grouped_regression', 'price_statistics', 'read_cars'],
+    'distribution': ['ProductionDistribution', 'production_distribution'],
+    'instrumentation': ['Stage', 'instrument'],
+    'make_a_chart': ['generate_plot_ecdf', 'horizontal_bar_chart', 'plot_cdf', 'plot_histogram',
+                     'plot_multiple_histograms', 'plot_segment_distributions'],
+    'parameter_store': ['PARAMETERS_FILE', 'load_parameters', 'params', 'save_parameters'],
+    'pipeline': ['load_production', 'simulate_locations_summary'],
+    'read_files': ['read_json_files', 'read_json_files_cached', 'read_locations', 'read_production'],
+    'reports': ['ReportRenderer'],
+    'samplers': ['UniformSampler', 'daily_production'],
+    'segment_calculations': ['calculate_and_save_segments_values', 'create_all_segments', 'create_segments',
+                             'print_segment_share', 'refresh_segments_values', 'select_thresholds_2'],
+    'simulate': ['NUM_VALUES', 'segment_parameters', 'simulate', 'simulate_estimates', 'simulate_horizons',
+                 'simulate_locations', 'simulate_parallel', 'simulate_summary'],
+    'simulation_cache': ['cached_simulate', 'cached_simulate_location'],
+    'summaries': ['QuantileSketch', 'RunningMoments', 'SimulationSummary', 'StreamingHistogram'],
+    'synthetic_data': ['generate_daily_production'],
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    """
+    Import a public name from its module on first access (and keep it, so later access is a normal lookup).
+    """
+
+    if name not in _MODULES:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_MODULES[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
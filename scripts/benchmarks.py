@@ -0,0 +1,308 @@
+"""
+Benchmarks of the pipeline stages on synthetic data.
+
+Examples:
+    python scripts/benchmarks.py --years 5 --locations 2 --output results.json
+    python scripts/benchmarks.py --output new.json --baseline results.json      (exit code 1 on a regression)
+    python scripts/benchmarks.py --imports-only --output imports.json           (exit code 1 over an import budget)
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from read_files import read_json_files, read_locations
+from segment_calculations import calculate_and_save_segments_values, create_segments
+from simulate import NUM_VALUES, segment_parameters, simulate
+from synthetic_data import fitted_parameters, generate_daily_production, scale_parameters
+
+# Folder of the scripts and default file of the benchmark results
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_FILE = os.path.join(SCRIPTS_DIR, '..', 'data', 'benchmarks', 'results.json')
+
+# First threshold of the segments of the synthetic locations (threshold_2 comes with their segment values)
+THRESHOLD_1 = 10**(-8)
+
+# A benchmark is a regression when it is this much slower than the baseline (0.2 = 20% slower)
+TOLERANCE = 0.2
+
+# Import-time budget of the modules that scheduled jobs and simulation workers start with, in a fresh process,
+# as a multiple of the import time of IMPORT_REFERENCE in the same run (so it does not depend on the machine).
+# The budgets are targets per dependency: simulate and make_a_chart only need numpy, cars, segment_calculations
+# and pipeline pandas, and reports pandas and matplotlib.figure; scipy and matplotlib.pyplot are imported in the
+# functions that need them.
+IMPORT_REFERENCE = 'numpy'
+IMPORT_BUDGETS = {
+    'scripts': 0.1,
+    'instrumentation': 0.25,
+    'simulate': 2,
+    'cars': 5,
+    'make_a_chart': 2,
+    'segment_calculations': 5,
+    'pipeline': 5,
+    'reports': 11
+}
+
+
+def measure(function, *args, repeat=3, **kwargs):
+    """
+    Time a function and measure its peak memory use.
+
+    Parameters:
+        function (callable): The function to measure.
+        *args, **kwargs: The arguments of the function.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        tuple: The result of the last run and a dict with the best and mean wall time (s) of the timed runs and
+               the peak of the memory allocated by Python and NumPy during one extra run (bytes).
+
+    The memory is measured in a separate run, so the overhead of tracemalloc does not count in the times.
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, {'best': min(times), 'mean': float(np.mean(times)), 'peak_memory': peak_memory}
+
+
+def measure_import_time(module, repeat=3):
+    """
+    Measure the time to import a module in a fresh Python process, like a scheduled job or a pool worker.
+
+    Parameters:
+        module (str): The module, e.g. 'simulate' or 'scripts' (the package).
+        repeat (int): Number of processes.
+
+    Returns:
+        dict: The best and mean import time (s) of the processes.
+    """
+
+    code = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    # The package needs the parent folder on the path, the modules the scripts folder
+    python_path = [os.path.dirname(SCRIPTS_DIR), SCRIPTS_DIR]
+    if os.environ.get('PYTHONPATH'):
+        python_path.append(os.environ['PYTHONPATH'])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+
+    times = [float(subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                                  check=True).stdout) for _ in range(repeat)]
+
+    return {'best': min(times), 'mean': float(np.mean(times))}
+
+
+def run_import_benchmarks(budgets=IMPORT_BUDGETS, repeat=3):
+    """
+    Measure the import time of IMPORT_REFERENCE and every module of the budgets (see measure_import_time).
+
+    Returns:
+        dict: The results per benchmark, named 'import_<module>'.
+    """
+
+    return {f'import_{module}': measure_import_time(module, repeat) for module in [IMPORT_REFERENCE, *budgets]}
+
+
+def check_import_budgets(results, budgets=IMPORT_BUDGETS):
+    """
+    Compare the measured import times with their budget.
+
+    Parameters:
+        results (dict): The results per benchmark (see run_import_benchmarks).
+        budgets (dict): Import-time budget per module, as a multiple of the import time of IMPORT_REFERENCE.
+
+    Returns:
+        DataFrame: Per module the best import time (s), the ratio to IMPORT_REFERENCE, the budget and whether
+                   the ratio is over budget.
+    """
+
+    reference = results[f'import_{IMPORT_REFERENCE}']['best']
+    modules = [module for module in budgets if f'import_{module}' in results]
+    check = pd.DataFrame({
+        'import_time': [results[f'import_{module}']['best'] for module in modules],
+        'budget': [budgets[module] for module in modules]
+    }, index=modules)
+    check.insert(1, 'ratio', check['import_time'] / reference)
+    check['over_budget'] = check['ratio'] > check['budget']
+
+    return check
+
+
+def environment_info():
+    """
+    Describe the code and machine of a benchmark run (git commit, versions, platform, number of CPUs).
+    """
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SCRIPTS_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def run_benchmarks(years=5, n_locations=2, num_values=NUM_VALUES, n_days=365, repeat=3, seed=0):
+    """
+    Generate a synthetic data set and benchmark every stage of the pipeline on it, and the import times.
+
+    Parameters:
+        years (int): Number of years of data per location.
+        n_locations (int): Number of locations (the BRU and STO values are repeated, see scale_parameters).
+        num_values (int): Number of simulated trials.
+        n_days (int): Number of simulated days.
+        repeat (int): Number of timed runs per benchmark.
+        seed (int): Seed of the synthetic data and the simulation.
+
+    Returns:
+        dict: The settings, the environment (see environment_info) and the results per benchmark.
+    """
+
+    fitted = fitted_parameters()
+    parameters = scale_parameters(fitted, n_locations)
+    thresholds_2 = {location: params['threshold_2'] for location, params in parameters.items()}
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        directories = generate_daily_production(os.path.join(work_dir, 'daily_production'), parameters, years,
+                                                seed=seed)
+
+        # read_json_files: one location at a time, like the notebook
+        df, results['read_json_files'] = measure(
+            lambda: pd.concat([read_json_files(directory, location) for location, directory in directories.items()],
+                              ignore_index=True), repeat=repeat)
+        _, results['read_locations_threads'] = measure(read_locations, directories, max_workers=8, repeat=repeat)
+
+        df = df[df['maintenance'] == 'No'].copy()
+        df['production'] = pd.to_numeric(df['production'], errors='coerce')
+
+        segments, results['create_segments'] = measure(
+            lambda: {location: create_segments(location, THRESHOLD_1, thresholds_2[location], df)
+                     for location in parameters}, repeat=repeat)
+
+        def save_all():
+            for location, (share_1, share_2, share_3, segment_1, segment_2, segment_3) in segments.items():
+                calculate_and_save_segments_values(location, THRESHOLD_1, thresholds_2[location], share_1, segment_2,
+                                                   segment_3, share_2, share_3,
+                                                   os.path.join(work_dir, f'{location}.json'))
+        _, results['calculate_and_save_segments_values'] = measure(save_all, repeat=repeat)
+
+    params = segment_parameters(fitted['BRU'])
+    _, results['simulate'] = measure(simulate, *params, n_days, num_values=num_values, rng=seed, repeat=repeat)
+    results.update(run_import_benchmarks(repeat=repeat))
+
+    return {
+        'settings': {'years': years, 'locations': n_locations, 'num_values': num_values, 'n_days': n_days,
+                     'repeat': repeat, 'seed': seed},
+        'environment': environment_info(),
+        'results': results
+    }
+
+
+def compare_results(baseline, current, tolerance=TOLERANCE):
+    """
+    Compare the best times of two benchmark runs.
+
+    Parameters:
+        baseline (dict): The results of the reference run (e.g. of the previous commit).
+        current (dict): The results of the new run.
+        tolerance (float): Allowed slowdown before a benchmark counts as a regression (0.2 = 20%).
+
+    Returns:
+        DataFrame: Per benchmark the baseline and current best time, their ratio and whether it is a regression.
+    """
+
+    names = [name for name in current['results'] if name in baseline['results']]
+    comparison = pd.DataFrame({
+        'baseline': [baseline['results'][name]['best'] for name in names],
+        'current': [current['results'][name]['best'] for name in names]
+    }, index=names)
+    comparison['ratio'] = comparison['current'] / comparison['baseline']
+    comparison['regression'] = comparison['ratio'] > 1 + tolerance
+
+    return comparison
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command-line arguments (sys.argv by default).
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--years', type=int, default=5, help='Years of synthetic data per location.')
+    parser.add_argument('--locations', type=int, default=2, help='Number of synthetic locations.')
+    parser.add_argument('--num-values', type=int, default=NUM_VALUES, help='Number of simulated trials.')
+    parser.add_argument('--n-days', type=int, default=365, help='Number of simulated days.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per benchmark.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the data and the simulation.')
+    parser.add_argument('--output', default=BENCHMARK_FILE, help='File for the results (JSON).')
+    parser.add_argument('--baseline', default=None, help='Results file to compare with.')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='Allowed slowdown (0.2 = 20%%).')
+    parser.add_argument('--imports-only', action='store_true', help='Only measure the import times.')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run the benchmarks, save the results and compare them with the import budgets and a baseline.
+
+    Returns:
+        int: 1 if a module takes longer to import than its budget or (with a baseline) a benchmark is slower than
+             the baseline by more than the tolerance, else 0.
+    """
+
+    args = parse_arguments(argv)
+    if args.imports_only:
+        results = {'settings': {'repeat': args.repeat}, 'environment': environment_info(),
+                   'results': run_import_benchmarks(repeat=args.repeat)}
+    else:
+        results = run_benchmarks(args.years, args.locations, args.num_values, args.n_days, args.repeat, args.seed)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as json_file:
+        json.dump(results, json_file, indent=4)
+
+    table = pd.DataFrame(results['results']).T
+    print(table.to_string(float_format=lambda value: f'{value:.4g}'))
+
+    budgets = check_import_budgets(results['results'])
+    print(budgets.to_string(float_format=lambda value: f'{value:.4g}'))
+    if args.baseline is None:
+        return int(budgets['over_budget'].any())
+
+    with open(args.baseline, 'r') as json_file:
+        comparison = compare_results(json.load(json_file), results, args.tolerance)
+    print(comparison.to_string(float_format=lambda value: f'{value:.4g}'))
+
+    return int(budgets['over_budget'].any() or comparison['regression'].any())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+
+from fuel_mappings import fuel_mapping
+from instrumentation import instrument
+
+# Columns of cars.csv that are used in the analysis, with their (compact) data types
+CARS_SCHEMA = {
+    'manufacturer': 'category',
+    'year': 'Int16',
+    'mileage': 'float32',
+    'fuel_type': 'category',
+    'accidents_or_damage': 'float32',
+    'price': 'float32'
+}
+
+# Default number of rows per chunk (the memory use grows with the chunk size, not with the file size)
+CHUNK_SIZE = 100_000
+
+
+def map_fuel_types(fuel_types, mapping=fuel_mapping):
+    """
+    Map fuel types to a few fuel type categories, on the categories instead of on every row.
+
+    Parameters:
+        fuel_types (Series): Categorical fuel types.
+        mapping (dict): The fuel type category of every fuel type (see fuel_mappings.fuel_mapping).
+                        A NaN key gives the category of missing fuel types.
+
+    Returns:
+        Series: Categorical mapped fuel types, the same as fuel_types.map(mapping) on object data
+                (fuel types without a category become NaN).
+    """
+
+    fuel_types = fuel_types.astype('category')
+    missing_category = next((value for key, value in mapping.items() if isinstance(key, float) and np.isnan(key)),
+                            np.nan)
+
+    # Map the (few) categories, then translate the codes of all rows at once
+    mapped = pd.Series(fuel_types.cat.categories).map(mapping)
+    categories = pd.Index(pd.unique(pd.concat([mapped, pd.Series([missing_category])]).dropna()))
+    translation = np.append(categories.get_indexer(mapped), categories.get_indexer([missing_category]))
+    codes = translation[fuel_types.cat.codes.to_numpy()]  # code -1 (missing) takes the last entry
+
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=fuel_types.index,
+                     name=fuel_types.name)
+
+
+@instrument('load', count=len)
+def read_cars(filename, schema=CARS_SCHEMA, chunksize=CHUNK_SIZE, deduplicate=True, dedup_columns=None,
+              mapping=fuel_mapping):
+    """
+    Read cars.csv in chunks into a compact, typed DataFrame without duplicates.
+
+    Parameters:
+        filename (str): The path to the CSV file.
+        schema (dict): The columns to keep with their data types (see CARS_SCHEMA). Other columns are dropped.
+        chunksize (int): Number of rows per chunk.
+        deduplicate (bool): Whether to drop duplicate rows (the first one is kept). Default is True.
+        dedup_columns (list or None): Columns that define a duplicate. Default is None: all columns of the file,
+                                      like df.duplicated() on the full file.
+        mapping (dict or None): Fuel type mapping (see map_fuel_types). Default is fuel_mappings.fuel_mapping.
+                                None keeps the original fuel types.
+
+    Returns:
+        DataFrame: The columns of the schema for the unique rows, with a new RangeIndex.
+
+    Every chunk is hashed (on the dedup columns) and then reduced to the schema right away, so the other columns
+    only exist for one chunk at a time; without deduplication (or with dedup_columns) only the columns that are
+    needed are read. Duplicates are found with a 64-bit hash of every row: the hashes of earlier chunks are kept
+    in a sorted array, so duplicates in different chunks are found as well.
+    """
+
+    schema_columns = list(schema)
+    if deduplicate and dedup_columns is None:
+        hash_columns = usecols = None  # all columns
+    else:
+        hash_columns = list(dedup_columns or [])
+        usecols = schema_columns + [column for column in hash_columns if column not in schema]
+    dtypes = {column: dtype for column, dtype in schema.items() if dtype == 'category'}
+
+    chunks = []
+    seen_hashes = np.empty(0, dtype=np.uint64)
+    for chunk in pd.read_csv(filename, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        if deduplicate:
+            # Numbers are hashed as float64: a column can be parsed as int64 in one chunk and float64 in another
+            key = chunk if hash_columns is None else chunk[hash_columns]
+            key = key.astype({column: 'float64' for column in key.select_dtypes('number').columns})
+            hashes = pd.util.hash_pandas_object(key, index=False).to_numpy()
+            unique = ~pd.Series(hashes).duplicated().to_numpy()
+            if len(seen_hashes):
+                positions = np.minimum(np.searchsorted(seen_hashes, hashes), len(seen_hashes) - 1)
+                unique &= seen_hashes[positions] != hashes
+            new_hashes = np.sort(hashes[unique])
+            seen_hashes = np.insert(seen_hashes, np.searchsorted(seen_hashes, new_hashes), new_hashes)
+            chunk = chunk[unique]
+
+        chunks.append(chunk[schema_columns].astype({column: dtype for column, dtype in schema.items()
+                                                    if dtype != 'category'}))
+
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schema.items()})
+
+    # Combine the chunks; categorical columns get the union of the categories of all chunks
+    df = pd.DataFrame(index=pd.RangeIndex(sum(len(chunk) for chunk in chunks)))
+    for column, dtype in schema.items():
+        if dtype == 'category':
+            df[column] = pd.api.types.union_categoricals([chunk[column] for chunk in chunks])
+        else:
+            df[column] = pd.concat([chunk[column] for chunk in chunks], ignore_index=True)
+
+    if mapping is not None and 'fuel_type' in df.columns:
+        df['fuel_type'] = map_fuel_types(df['fuel_type'], mapping)
+
+    return df
+
+
+@instrument('aggregate', count=len)
+def price_statistics(df, keys=('manufacturer', 'accidents_or_damage', 'fuel_type'), value='price', dropna=False):
+    """
+    Calculate count, mean, median and standard deviation of the price per group, in one grouped pass.
+
+    Parameters:
+        df (DataFrame): The car data.
+        keys (sequence): The grouping columns. Default is manufacturer x accidents_or_damage x fuel_type.
+        value (str): The column to summarize. Default is 'price'.
+        dropna (bool): Whether to leave out rows with a missing key. Default is False (missing keys form their
+                       own group, so statistics of coarser groups can still be calculated with combine_statistics).
+
+    Returns:
+        DataFrame: A tidy table with one row per group: the keys and count, mean, median and std.
+
+    The groups are determined once; every statistic is then calculated per group in a single scan of the data,
+    instead of filtering the full frame per group and condition.
+    """
+
+    # Statistics in float64, also for a compact float32 column
+    values = df[value].astype('float64')
+    statistics = (values.groupby([df[key] for key in keys], observed=True, sort=True, dropna=dropna)
+                        .agg(['count', 'mean', 'median', 'std']))
+
+    return statistics.reset_index()
+
+
+def combine_statistics(statistics, keys=('manufacturer',)):
+    """
+    Combine the statistics of price_statistics into coarser groups, without going over the data again.
+
+    Parameters:
+        statistics (DataFrame): The result of price_statistics.
+        keys (sequence): The grouping columns to keep (a subset of the keys of statistics).
+                         An empty sequence gives the statistics of all rows together.
+
+    Returns:
+        DataFrame: A tidy table with the keys and count, mean and std per coarser group.
+                   The median can not be combined; use price_statistics with these keys for it.
+
+    Counts and sums are added and the variances are pooled (with the spread of the group means), so the result is
+    the same as calculating the statistics on the data of the coarser groups.
+    """
+
+    keys = list(keys)
+    count = statistics['count']
+    parts = pd.DataFrame({
+        'count': count,
+        'sum': count * statistics['mean'],
+        'sum_squares': (count - 1).clip(lower=0) * statistics['std'].fillna(0) ** 2 + count * statistics['mean'] ** 2
+    })
+    if keys:
+        totals = parts.groupby([statistics[key] for key in keys], observed=True, dropna=False).sum()
+    else:
+        totals = parts.sum().to_frame().T
+
+    combined = pd.DataFrame({'count': totals['count'].astype('int64')})
+    combined['mean'] = totals['sum'] / totals['count']
+    variance = (totals['sum_squares'] - totals['count'] * combined['mean'] ** 2) / (totals['count'] - 1)
+    combined['std'] = np.sqrt(variance.clip(lower=0))
+
+    return combined.reset_index(drop=not keys)
+
+
+def weighted_line_fit(codes, n_groups, x, y, weights, x_offset=0.0, y_offset=0.0):
+    """
+    Fit a straight line per group from weighted grouped sums (used by grouped_regression).
+
+    Parameters:
+        codes (numpy.ndarray): The group number of every row.
+        n_groups (int): Number of groups.
+        x, y (numpy.ndarray): The (centered) values.
+        weights (numpy.ndarray): The weight of every row.
+        x_offset, y_offset (float): The centering: the original values are x + x_offset and y + y_offset.
+
+    Returns:
+        dict: Per group the arrays count, slope, intercept, r_squared, slope_se and intercept_se
+              (the intercept and its standard error for the original values).
+    """
+
+    def group_sum(values):
+        return np.bincount(codes, weights=values, minlength=n_groups)
+
+    count = np.bincount(codes, minlength=n_groups)
+    sum_w = group_sum(weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = group_sum(weights * x) / sum_w
+        mean_y = group_sum(weights * y) / sum_w
+
+        # Sums of squares around the group means (from Σwx², Σwxy, Σwy²)
+        s_xx = group_sum(weights * x * x) - sum_w * mean_x ** 2
+        s_xy = group_sum(weights * x * y) - sum_w * mean_x * mean_y
+        s_yy = group_sum(weights * y * y) - sum_w * mean_y ** 2
+
+        slope = s_xy / s_xx
+        intercept = mean_y + y_offset - slope * (mean_x + x_offset)
+        r_squared = s_xy ** 2 / (s_xx * s_yy)
+
+        # Residual variance with n - 2 degrees of freedom (for weights 1: SSE / (n - 2))
+        residual_variance = np.maximum(s_yy - slope * s_xy, 0) / (sum_w * (count - 2) / count)
+        slope_se = np.sqrt(residual_variance / s_xx)
+        intercept_se = np.sqrt(residual_variance * (1 / sum_w + (mean_x + x_offset) ** 2 / s_xx))
+
+    return {'count': count, 'slope': slope, 'intercept': intercept, 'r_squared': r_squared,
+            'slope_se': slope_se, 'intercept_se': intercept_se}
+
+
+@instrument('aggregate', count=len)
+def grouped_regression(df, keys=('manufacturer',), x='mileage', y='price', robust=False, iterations=20,
+                       huber_constant=1.345):
+    """
+    Fit the straight line y = intercept + slope * x (ordinary least squares) for every group at once.
+
+    Parameters:
+        df (DataFrame): The car data.
+        keys (sequence): The grouping columns. Default is manufacturer. An empty sequence fits one line on all rows
+                         (like np.polyfit(x, y, 1)).
+        x (str): The explanatory column. Default is 'mileage'.
+        y (str): The dependent column. Default is 'price'.
+        robust (bool): Whether to reduce the influence of outliers with Huber weights
+                       (iteratively reweighted least squares). Default is False.
+        iterations (int): Maximum number of reweighting iterations for robust=True (it stops earlier when the
+                          slopes no longer change).
+        huber_constant (float): Residuals larger than this many robust standard deviations get a lower weight.
+
+    Returns:
+        DataFrame: A tidy table with one row per group: the keys and count, slope, intercept, r_squared,
+                   slope_se and intercept_se (standard errors). Rows with a missing key, x or y are left out.
+
+    The lines follow in closed form from the grouped sums Σx, Σy, Σxy, Σx², Σy², which are added per group
+    with numpy.bincount in one pass over all rows. For robust=True every iteration is one more such pass with
+    weights min(1, c * s / |residual|), where s is the scaled MAD of the residuals of the group; its R² and
+    standard errors are those of the final weighted fit.
+    """
+
+    keys = list(keys)
+    data = df[keys + [x, y]].dropna()
+    values_x = data[x].to_numpy(dtype=float)
+    values_y = data[y].to_numpy(dtype=float)
+
+    # Center on the overall means, so the sums of squares do not lose precision
+    x_offset = values_x.mean() if len(values_x) else 0.0
+    y_offset = values_y.mean() if len(values_y) else 0.0
+    values_x = values_x - x_offset
+    values_y = values_y - y_offset
+
+    # Group number of every row: factorize every key, then number the combinations that occur
+    key_codes, key_values = zip(*(pd.factorize(data[key], sort=True) for key in keys)) if keys else ((), ())
+    shape = [len(values) for values in key_values]
+    combinations = np.ravel_multi_index(key_codes, shape) if keys else np.zeros(len(data), dtype=np.int64)
+    observed, codes = np.unique(combinations, return_inverse=True)
+    n_groups = len(observed)
+    groups = pd.DataFrame(index=pd.RangeIndex(n_groups))
+    for key, values, indices in zip(keys, key_values, np.unravel_index(observed, shape) if keys else ()):
+        groups[key] = values.take(indices)
+
+    fit = weighted_line_fit(codes, n_groups, values_x, values_y, np.ones(len(data)), x_offset, y_offset)
+    for _ in range(iterations if robust else 0):
+        centered_intercept = fit['intercept'] - y_offset + fit['slope'] * x_offset
+        absolute_residuals = np.abs(values_y - centered_intercept[codes] - fit['slope'][codes] * values_x)
+        scale = pd.Series(absolute_residuals).groupby(codes).median().reindex(range(n_groups)).to_numpy() / 0.6745
+        limit = huber_constant * scale[codes]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = np.where(absolute_residuals > limit, limit / absolute_residuals, 1.0)
+        previous_slope = fit['slope']
+        fit = weighted_line_fit(codes, n_groups, values_x, values_y, weights, x_offset, y_offset)
+        if np.allclose(fit['slope'], previous_slope, rtol=1e-6, atol=0, equal_nan=True):
+            break
+
+    return groups.assign(**fit)
@@ -0,0 +1,197 @@
+import numpy as np
+
+from simulate import segment_parameters
+
+# Number of grid points over the daily production range when no grid step is given
+GRID_POINTS = 1000
+
+# Number of standard deviations of the normal distribution (segment 3) covered by the daily grid
+NORMAL_RANGE = 8
+
+# Probability mass that may be cut from each tail while convolving
+TAIL_MASS = 1e-12
+
+
+class ProductionDistribution:
+    """
+    Discretized distribution of the total production over a number of days.
+
+    Attributes:
+        n_days (int): Number of days the distribution represents.
+        grid_step (float): Distance between two grid points.
+        values (numpy.ndarray): The production values of the grid.
+        pmf (numpy.ndarray): Probability of each grid value.
+        pdf (numpy.ndarray): Density at each grid value (pmf / grid_step).
+        cdf_values (numpy.ndarray): Cumulative probability at each grid value.
+        mean (float): Mean of the distribution.
+        std (float): Standard deviation of the distribution.
+    """
+
+    def __init__(self, n_days, grid_step, offset, pmf):
+        self.n_days = n_days
+        self.grid_step = grid_step
+        self.values = (offset + np.arange(len(pmf))) * grid_step
+        self.pmf = pmf
+        self.pdf = pmf / grid_step
+        self.cdf_values = np.minimum(np.cumsum(pmf), 1.0)
+        self.mean = float(np.dot(self.values, pmf))
+        self.std = float(np.sqrt(max(np.dot((self.values - self.mean) ** 2, pmf), 0.0)))
+
+    def cdf(self, x):
+        """
+        Calculate the cumulative probability P(production <= x).
+
+        Parameters:
+            x (float or array-like): Production value(s).
+
+        Returns:
+            float or numpy.ndarray: The cumulative probability of each value.
+        """
+
+        return np.interp(x, self.values, self.cdf_values, left=0.0, right=1.0)
+
+    def quantile(self, q):
+        """
+        Calculate the production value(s) below which a given share of the outcomes lies.
+
+        Parameters:
+            q (float or array-like): Probabilities between 0 and 1 (e.g. 0.05 for the 5% percentile).
+
+        Returns:
+            float or numpy.ndarray: The smallest grid value with a cumulative probability >= q.
+        """
+
+        indices = np.searchsorted(self.cdf_values, q, side='left')
+
+        return self.values[np.minimum(indices, len(self.values) - 1)]
+
+
+def daily_distribution(share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3, grid_step):
+    """
+    Discretize the daily production mixture on a grid.
+
+    Parameters:
+        share_1 (float): Share of production for segment 1 (point mass at 0).
+        share_2 (float): Share of production for segment 2.
+        lower_bound_s2 (float): Lower bound threshold for segment 2.
+        upper_bound_s2 (float): Upper bound threshold for segment 2.
+        param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
+        param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
+        grid_step (float): Distance between two grid points.
+
+    Returns:
+        tuple: The grid index of the first value and the probability of each grid value.
+
+    Grid value k * grid_step gets the probability mass of the interval [(k - 0.5), (k + 0.5)) * grid_step.
+    """
+
+    from scipy.special import ndtr
+
+    share_3 = max(0.0, 1.0 - share_1 - share_2)
+
+    # Grid indices covering the point mass, the uniform range and the bulk of the normal distribution
+    lowest = min(0.0, lower_bound_s2, param1_s3 - NORMAL_RANGE * param2_s3)
+    highest = max(0.0, upper_bound_s2, param1_s3 + NORMAL_RANGE * param2_s3)
+    offset = int(np.floor(lowest / grid_step))
+    indices = np.arange(offset, int(np.ceil(highest / grid_step)) + 1)
+    edges = (np.append(indices, indices[-1] + 1) - 0.5) * grid_step
+
+    # Segment 2: uniform distribution
+    if upper_bound_s2 > lower_bound_s2:
+        cdf_s2 = np.clip((edges - lower_bound_s2) / (upper_bound_s2 - lower_bound_s2), 0.0, 1.0)
+    else:
+        cdf_s2 = (edges > lower_bound_s2).astype(float)
+
+    # Segment 3: normal distribution
+    cdf_s3 = ndtr((edges - param1_s3) / param2_s3)
+
+    pmf = np.diff(share_2 * cdf_s2 + share_3 * cdf_s3)
+
+    # Segment 1: point mass at 0
+    pmf[-offset] += share_1
+
+    return offset, pmf / pmf.sum()
+
+
+def trim(offset, pmf):
+    """
+    Cut the negligible tails (TAIL_MASS on each side) of a discretized distribution.
+
+    Parameters:
+        offset (int): The grid index of the first value.
+        pmf (numpy.ndarray): Probability of each grid value.
+
+    Returns:
+        tuple: The grid index of the first value and the probability of each remaining grid value.
+    """
+
+    cumulative = np.cumsum(pmf)
+    first = np.searchsorted(cumulative, TAIL_MASS, side='right')
+    last = np.searchsorted(cumulative, cumulative[-1] - TAIL_MASS, side='left')
+    last = min(max(last, first), len(pmf) - 1)
+
+    return offset + first, pmf[first:last + 1]
+
+
+def convolve(first, second):
+    """
+    Calculate the distribution of the sum of two independent discretized distributions with FFT.
+
+    Parameters:
+        first (tuple): The grid offset and probabilities of the first distribution.
+        second (tuple): The grid offset and probabilities of the second distribution.
+
+    Returns:
+        tuple: The grid offset and probabilities of the sum (with negligible tails cut).
+    """
+
+    length = len(first[1]) + len(second[1]) - 1
+    fft_length = 1 << (length - 1).bit_length()
+    pmf = np.fft.irfft(np.fft.rfft(first[1], fft_length) * np.fft.rfft(second[1], fft_length), fft_length)[:length]
+
+    # Remove the tiny negative values caused by rounding errors
+    pmf = np.maximum(pmf, 0.0)
+
+    return trim(first[0] + second[0], pmf / pmf.sum())
+
+
+def production_distribution(params, n_days, grid_step=None):
+    """
+    Calculate the exact distribution of the total production over a number of days, without sampling.
+
+    Parameters:
+        params (dict): Segment values of one location, e.g. data[location] of a saved JSON file.
+        n_days (int): Number of days.
+        grid_step (float or None): Distance between two grid points. Default is 1/GRID_POINTS of the
+                                   daily production range.
+
+    Returns:
+        ProductionDistribution: The distribution of the total production over n_days.
+
+    The daily production is a mixture of a point mass at 0 (share_1), a uniform distribution (share_2)
+    and a normal distribution (share_3). The total over n_days is the n-fold convolution of the daily
+    distribution, which is calculated on a grid with FFT and repeated squaring (about 2 * log2(n_days)
+    convolutions). The only approximation is the grid, so there is no Monte Carlo noise.
+    """
+
+    share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3 = segment_parameters(params)
+
+    if grid_step is None:
+        lowest = min(0.0, lower_bound_s2, param1_s3 - NORMAL_RANGE * param2_s3)
+        highest = max(0.0, upper_bound_s2, param1_s3 + NORMAL_RANGE * param2_s3)
+        grid_step = (highest - lowest) / GRID_POINTS
+
+    power = trim(*daily_distribution(share_1, share_2, lower_bound_s2, upper_bound_s2,
+                                     param1_s3, param2_s3, grid_step))
+    result = (0, np.ones(1))
+
+    # Repeated squaring: combine the powers of two that make up n_days
+    remaining = int(n_days)
+    while remaining > 0:
+        if remaining & 1:
+            result = convolve(result, power)
+        remaining >>= 1
+        if remaining:
+            power = convolve(power, power)
+
+    return ProductionDistribution(int(n_days), grid_step, *result)
@@ -0,0 +1,182 @@
+import functools
+import time
+import tracemalloc
+from collections import namedtuple
+
+# One measured call of a stage: wall and CPU time (s), peak memory above the start of the stage (bytes, None when
+# memory is not traced) and the number of rows or trials it handled (None when unknown)
+StageRecord = namedtuple('StageRecord', ['stage', 'name', 'wall_time', 'cpu_time', 'peak_memory', 'count'])
+
+
+class Instrumentation:
+    """
+    State of the instrumentation: whether it is enabled, the callbacks, the records and the stack of open stages.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.started_tracemalloc = False
+        self.callbacks = []
+        self.records = []
+        self.stack = []
+
+
+_state = Instrumentation()
+
+
+def enable(callback=None, memory=True):
+    """
+    Start recording the instrumented stages.
+
+    Parameters:
+        callback (callable or None): Function that is called with every StageRecord (e.g. to send it to a
+                                     metrics system). Default is None (only keep the records for report()).
+        memory (bool): Whether to trace the peak memory with tracemalloc. Default is True.
+                       Tracing makes the code itself slower, so switch it off to measure only the times.
+    """
+
+    if callback is not None and callback not in _state.callbacks:
+        _state.callbacks.append(callback)
+    _state.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state.started_tracemalloc = True
+    _state.enabled = True
+
+
+def disable():
+    """
+    Stop recording (the records are kept until reset) and remove the callbacks.
+    """
+
+    _state.enabled = False
+    _state.callbacks.clear()
+    _state.stack.clear()
+    if _state.started_tracemalloc:
+        tracemalloc.stop()
+        _state.started_tracemalloc = False
+
+
+def reset():
+    """
+    Delete the records.
+    """
+
+    _state.records.clear()
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def records():
+    """
+    Return the StageRecords of all measured calls, in the order in which the calls ended.
+    """
+
+    return list(_state.records)
+
+
+def report():
+    """
+    Summarize the records per stage and function.
+
+    Returns:
+        DataFrame: Per stage and name the number of calls, the total wall and CPU time, the largest peak memory
+                   and the total count, sorted by total wall time. Nested stages are included in their parent.
+    """
+
+    import pandas as pd
+
+    df = pd.DataFrame(_state.records, columns=StageRecord._fields)
+
+    return (df.groupby(['stage', 'name'], sort=False)
+              .agg(calls=('wall_time', 'size'), wall_time=('wall_time', 'sum'), cpu_time=('cpu_time', 'sum'),
+                   peak_memory=('peak_memory', 'max'), count=('count', lambda counts: counts.sum(min_count=1)))
+              .sort_values('wall_time', ascending=False))
+
+
+class Stage:
+    """
+    Context manager that measures a block of code as a stage, e.g.
+
+        with Stage('load', 'read all files') as measurement:
+            df = ...
+            measurement.count = len(df)
+
+    When the instrumentation is disabled it does nothing.
+    """
+
+    def __init__(self, stage_name, name=None):
+        self.stage_name = stage_name
+        self.name = name or stage_name
+        self.count = None
+
+    def __enter__(self):
+        if not _state.enabled:
+            self.active = False
+            return self
+        self.active = True
+
+        if _state.memory and tracemalloc.is_tracing():
+            # Keep the peak of the enclosing stage before the peak is reset for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if _state.stack:
+                _state.stack[-1].peak = max(_state.stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = self.peak = current
+        else:
+            self.start_memory = None
+        _state.stack.append(self)
+
+        self.start_cpu_time = time.process_time()
+        self.start_wall_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.active:
+            return False
+        wall_time = time.perf_counter() - self.start_wall_time
+        cpu_time = time.process_time() - self.start_cpu_time
+
+        peak_memory = None
+        if self.start_memory is not None and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak_memory = self.peak - self.start_memory
+        if _state.stack and _state.stack[-1] is self:
+            _state.stack.pop()
+            if _state.stack and peak_memory is not None:
+                _state.stack[-1].peak = max(_state.stack[-1].peak, self.peak)
+                tracemalloc.reset_peak()
+
+        record = StageRecord(self.stage_name, self.name, wall_time, cpu_time, peak_memory, self.count)
+        _state.records.append(record)
+        for callback in _state.callbacks:
+            callback(record)
+        return False
+
+
+def instrument(stage_name, count=None):
+    """
+    Decorator that measures every call of a function as a stage (see Stage).
+
+    Parameters:
+        stage_name (str): The stage of the pipeline, e.g. 'load', 'segment', 'fit', 'simulate' or 'plot'.
+        count (callable or None): Function that gets the number of rows or trials from the result, e.g. len.
+
+    When the instrumentation is disabled the function is called directly; the only cost is one check.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return function(*args, **kwargs)
+            with Stage(stage_name, function.__name__) as measurement:
+                result = function(*args, **kwargs)
+                if count is not None:
+                    measurement.count = count(result)
+            return result
+        return wrapper
+    return decorator
@@ -1,9 +1,73 @@
-import matplotlib.pyplot as plt
 import numpy as np
-import scipy.stats as stats
-from scipy.stats import norm
 
+from distribution import ProductionDistribution
+from instrumentation import instrument
 
+# Number of points that an ECDF is drawn with (looks the same as all points at screen resolution)
+ECDF_POINTS = 512
+
+
+def is_summary(data):
+    """
+    Check whether data is a summary of values instead of the values themselves.
+
+    Parameters:
+        data: Array-like data, or an object with `quantile` and `cdf` methods
+              (e.g. a SimulationSummary or a ProductionDistribution).
+
+    Returns:
+        bool: True if data is a summary.
+    """
+
+    return hasattr(data, 'quantile') and hasattr(data, 'cdf')
+
+
+def ecdf_points(data, points=ECDF_POINTS):
+    """
+    Calculate a fixed number of points of the (empirical) cumulative distribution function.
+
+    Parameters:
+        data: Array-like data, or a summary with `quantile` and `cdf` methods
+              (e.g. a SimulationSummary or a ProductionDistribution).
+        points (int): Number of points. Default is ECDF_POINTS.
+
+    Returns:
+        tuple: The x values and their cumulative probabilities (numpy arrays of length points).
+
+    The x values are the quantiles at evenly spaced probabilities from 0 to 1, so the first and last point are
+    the minimum and maximum. For raw data they are found with numpy.quantile (without sorting all values);
+    for a summary its own quantile and cdf methods are used. The cost does not grow with the number of trials.
+    """
+
+    probabilities = np.linspace(0, 1, points)
+
+    if is_summary(data):
+        x_values = np.asarray(data.quantile(probabilities), dtype=float)
+        return x_values, np.asarray(data.cdf(x_values), dtype=float)
+
+    x_values = np.quantile(np.asarray(data, dtype=float), probabilities, method='inverted_cdf')
+    return x_values, probabilities
+
+
+def summary_histogram(data, bins):
+    """
+    Calculate the histogram of array-like data, or take it from a summary with a `histogram` method.
+
+    Parameters:
+        data: Array-like data or a summary (e.g. a SimulationSummary).
+        bins (int): Number of bins for array-like data.
+
+    Returns:
+        tuple: The counts per bin and the bin edges, or None if the summary has no histogram.
+    """
+
+    if is_summary(data):
+        return data.histogram() if hasattr(data, 'histogram') else None
+
+    return np.histogram(np.asarray(data, dtype=float), bins=bins)
+
+
+@instrument('plot')
 def horizontal_bar_chart(value_counts, chart_title, x_label, y_label):
     """
     Create a horizontal bar chart with customizable title and labels.
@@ -15,6 +79,8 @@ def horizontal_bar_chart(value_counts, chart_title, x_label, y_label):
     - y_label: string, the label for the y-axis.
     """
 
+    import matplotlib.pyplot as plt
+
     # Set up the figure size
     plt.figure(figsize=(10, 6))
 
@@ -37,6 +103,7 @@ def horizontal_bar_chart(value_counts, chart_title, x_label, y_label):
     plt.show()
 
 
+@instrument('plot')
 def generate_plot_ecdf(data,
                        median_price=None,
                        avg_price=None,
@@ -48,35 +115,39 @@ def generate_plot_ecdf(data,
     Calculate and plot the Empirical Cumulative Distribution Function (ECDF) for a 1D array of data.
 
     Parameters:
-    - data: array-like, the 1D array containing the data for which to calculate the ECDF.
+    - data: array-like, the 1D array containing the data for which to calculate the ECDF,
+      or a summary with quantile and cdf methods (e.g. a SimulationSummary).
     - median_price: float, optional, the median price to mark on the plot (vertical line).
     - avg_price: float, optional, the average price to mark on the plot (vertical line).
     - title: string, optional, the title of the plot.
     - xlabel: string, optional, the label for the x-axis.
     - ylabel: string, optional, the label for the y-axis.
-    - bins: int, optional, the number of bins for the histogram.
+    - bins: int, optional, the number of bins for the histogram (the bins of a summary are used as they are).
 
     Displays a plot showing the histogram and ECDF of the data, with optional vertical lines
-    marking the median and average prices.
+    marking the median and average prices. The ECDF is drawn as a step function through ECDF_POINTS quantiles.
     """
 
-    n = len(data)
-    x = np.sort(data)
-    y = np.arange(1, n + 1) / n
+    import matplotlib.pyplot as plt
+
+    x, y = ecdf_points(data)
+    histogram = summary_histogram(data, bins)
 
     fig, ax = plt.subplots(figsize=(10, 6))
-    ax.hist(data,
-            bins=bins,
-            color='skyblue',
-            edgecolor='black',
-            cumulative=True,
-            density=True,
-            alpha=0.5,
-            label='Histogram')
-    ax.plot(x,
+    if histogram is not None:
+        counts, edges = histogram
+        ax.hist(edges[:-1],
+                bins=edges,
+                weights=counts,
+                color='skyblue',
+                edgecolor='black',
+                cumulative=True,
+                density=True,
+                alpha=0.5,
+                label='Histogram')
+    ax.step(x,
             y,
-            marker='.',
-            linestyle='none',
+            where='post',
             color='blue',
             label='ECDF')
     ax.set_title(title)
@@ -130,7 +201,7 @@ def calculate_maximum(combined_df_cleaned, location):
     return maximum
 
 
-def generate_plot_point_distribution(segment_data, location, threshold_1, maximum):
+def generate_plot_point_distribution(segment_data, location, threshold_1, maximum, ax=None):
     """
     Plot the point distribution for a segment.
 
@@ -139,23 +210,28 @@ def generate_plot_point_distribution(segment_data, location, threshold_1, maximu
         location (str): The name of the location.
         threshold_1 (float): The threshold value for categorizing points.
         maximum (int): The maximum value for the x-axis.
+        ax (matplotlib Axes): The Axes object to draw onto. Default is None (the current Axes).
     """
 
+    if ax is None:
+        import matplotlib.pyplot as plt
+
+        ax = plt.gca()
+
     # Set histogram parameters
     width = maximum / 25
 
     # Plot histogram
-    xmin, xmax = plt.xlim()
-    plt.xlim(xmin=0, xmax=maximum)
-    plt.hist(segment_data, bins=1, density=True, alpha=0.6, width=width)
+    ax.set_xlim(0, maximum)
+    ax.hist(segment_data, bins=1, density=True, alpha=0.6, width=width)
 
     # Set plot title and labels
-    plt.title(f"{location} Production < {threshold_1} (Point value)")
-    plt.xlabel('Production')
-    plt.ylabel('Density')
+    ax.set_title(f"{location} Production < {threshold_1} (Point value)")
+    ax.set_xlabel('Production')
+    ax.set_ylabel('Density')
 
 
-def generate_plot_uniform_distribution(segment_data, location, lower_bound, upper_bound, maximum):
+def generate_plot_uniform_distribution(segment_data, location, lower_bound, upper_bound, maximum, ax=None):
     """
     Plot the uniform distribution for a segment.
 
@@ -165,6 +241,7 @@ def generate_plot_uniform_distribution(segment_data, location, lower_bound, uppe
         lower_bound (float): The lower bound threshold value.
         upper_bound (float): The upper bound threshold value.
         maximum (int): The maximum value for the x-axis.
+        ax (matplotlib Axes): The Axes object to draw onto. Default is None (the current Axes).
 
     This function plots the uniform distribution for a given segment using a histogram.
     It fits a uniform distribution to the segment data and overlays it on the histogram.
@@ -173,31 +250,39 @@ def generate_plot_uniform_distribution(segment_data, location, lower_bound, uppe
     threshold values, and labels the axes accordingly.
     """
 
+    import scipy.stats as stats
+
+    if ax is None:
+        import matplotlib.pyplot as plt
+
+        ax = plt.gca()
+
     # Fit uniform distribution to the segment data
     mean_norm, std_norm = stats.uniform.fit(segment_data)
 
     # Plot histogram
-    plt.hist(segment_data, bins=50, density=True, alpha=0.6, label='Histogram')
+    ax.hist(segment_data, bins=50, density=True, alpha=0.6, label='Histogram')
 
     # Set x-axis limits
-    xmin, xmax = plt.xlim()
-    plt.xlim(xmin=0, xmax=maximum)
+    xmin, xmax = ax.get_xlim()
+    ax.set_xlim(0, maximum)
 
     # Generate points for the uniform distribution
     x_norm = np.linspace(xmin, xmax, 100)
     p_norm = stats.uniform.pdf(x_norm, mean_norm, std_norm)
 
     # Plot uniform distribution
-    plt.plot(x_norm, p_norm, 'k', linewidth=2, label='Uniforme verdeling')
+    ax.plot(x_norm, p_norm, 'k', linewidth=2, label='Uniforme verdeling')
 
     # Set plot title and labels
-    plt.title(f"{lower_bound} <= {location} Production < {upper_bound} (Uniform Distribution)")
-    plt.xlabel('Production')
-    plt.ylabel('Density')
-    plt.legend()
+    ax.set_title(f"{lower_bound} <= {location} Production < {upper_bound} (Uniform Distribution)")
+    ax.set_xlabel('Production')
+    ax.set_ylabel('Density')
+    ax.legend()
 
 
-def generate_plot_normal_distribution(segment_data, location, threshold_2, maximum, mean_norm, std_norm):
+def generate_plot_normal_distribution(segment_data, location, threshold_2, maximum, mean_norm, std_norm,
+                                      ax=None):
     """
     Generate the normal distribution for a segment.
 
@@ -208,6 +293,7 @@ def generate_plot_normal_distribution(segment_data, location, threshold_2, maxim
         maximum (int): The maximum value for the x-axis.
         mean_norm (float): The mean of the normal distribution.
         std_norm (float): The standard deviation of the normal distribution.
+        ax (matplotlib Axes): The Axes object to draw onto. Default is None (the current Axes).
 
     This function generates and plots the normal distribution for a given segment using a histogram.
     It overlays the normal distribution curve on the histogram based on the provided mean and standard deviation.
@@ -215,27 +301,65 @@ def generate_plot_normal_distribution(segment_data, location, threshold_2, maxim
     The plot title indicates the location and the threshold value, and labels the axes accordingly.
     """
 
+    import scipy.stats as stats
+
+    if ax is None:
+        import matplotlib.pyplot as plt
+
+        ax = plt.gca()
+
     # Histogram plot for the segment
-    plt.hist(segment_data, bins=50, density=True, alpha=0.6, label='Histogram')
+    ax.hist(segment_data, bins=50, density=True, alpha=0.6, label='Histogram')
 
     # Set x-axis limits
-    xmin, xmax = plt.xlim()
-    plt.xlim(xmin=0, xmax=maximum)
+    xmin, xmax = ax.get_xlim()
+    ax.set_xlim(0, maximum)
 
     # Generate points for the normal distribution
     x_norm = np.linspace(xmin, xmax, 100)
     p_norm = stats.norm.pdf(x_norm, mean_norm, std_norm)
 
     # Plot normal distribution
-    plt.plot(x_norm, p_norm, 'k', linewidth=2, label='Normal distribution')
+    ax.plot(x_norm, p_norm, 'k', linewidth=2, label='Normal distribution')
 
     # Set plot title and labels
-    plt.title(f"{location} Production >= {threshold_2} (Normal distribution)")
-    plt.xlabel('Production')
-    plt.ylabel('Density')
-    plt.legend()
+    ax.set_title(f"{location} Production >= {threshold_2} (Normal distribution)")
+    ax.set_xlabel('Production')
+    ax.set_ylabel('Density')
+    ax.legend()
 
 
+@instrument('plot')
+def draw_segment_distributions(axes,
+                               segment_1,
+                               segment_2, lower_bound, upper_bound,
+                               segment_3, param1_s3, param2_s3,
+                               location,
+                               threshold_1, threshold_2, maximum):
+    """
+    Draw the distribution segments for a given location onto three Axes objects.
+
+    Parameters:
+        axes (sequence of matplotlib Axes): The three Axes objects to draw segment 1, 2 and 3 onto.
+        The other parameters are the same as for plot_segment_distributions.
+
+    Only the given Axes are used (no pyplot state), so the segments can also be drawn
+    onto a figure that is saved without being shown (see reports.py).
+    """
+
+    # Segment 1
+    generate_plot_point_distribution(segment_1['production'], location, threshold_1, maximum, ax=axes[0])
+
+    # Segment 2
+    generate_plot_uniform_distribution(segment_2['production'], location, lower_bound, upper_bound, maximum,
+                                       ax=axes[1])
+
+    # Segment 3
+    generate_plot_normal_distribution(segment_3['production'], location, threshold_2, maximum, param1_s3, param2_s3,
+                                      ax=axes[2])
+
+
+@instrument('plot')
 def plot_segment_distributions(segment_1,
                                segment_2, lower_bound, upper_bound,
                                segment_3, param1_s3, param2_s3,
@@ -259,26 +383,19 @@ def plot_segment_distributions(segment_1,
     The title of each subplot indicates the location and the relevant threshold value, and the x-axis represents production.
     """
 
-    # Create a graph for each segment
-    plt.subplots(1, 3, figsize=(25, 4), gridspec_kw={'width_ratios': [4, 4, 4]})
-
-    # Segment 1
-    plt.subplot(1, 3, 1)
-    generate_plot_point_distribution(segment_1['production'], location, threshold_1, maximum)
-
-    # Segment 2
-    plt.subplot(1, 3, 2)
-    generate_plot_uniform_distribution(segment_2['production'], location, lower_bound, upper_bound, maximum)
+    import matplotlib.pyplot as plt
 
-    # Segment 3
-    plt.subplot(1, 3, 3)
-    generate_plot_normal_distribution(segment_3['production'], location, threshold_2, maximum, param1_s3, param2_s3)
+    # Create a graph for each segment
+    fig, axes = plt.subplots(1, 3, figsize=(25, 4), gridspec_kw={'width_ratios': [4, 4, 4]})
+    draw_segment_distributions(axes, segment_1, segment_2, lower_bound, upper_bound, segment_3, param1_s3, param2_s3,
+                               location, threshold_1, threshold_2, maximum)
 
     # Show the whole
-    plt.subplots_adjust(wspace=0.2)
+    fig.subplots_adjust(wspace=0.2)
     plt.show()
 
 
+@instrument('plot')
 def plot_histogram(simulated_data, n_days, location):
     """
     Generate a histogram of production or simulation data for a given location.
@@ -294,6 +411,8 @@ def plot_histogram(simulated_data, n_days, location):
     and the y-axis represents the density of the data.
     """
 
+    import matplotlib.pyplot as plt
+
     # Calculate the number of bins (determined by trial & error)
     num_bins = max(int((np.max(simulated_data) - np.min(simulated_data)) / (2 * (n_days + 10))),150)
 
@@ -308,6 +427,7 @@ def plot_histogram(simulated_data, n_days, location):
     plt.show()
 
 
+@instrument('plot')
 def plot_multiple_histograms(ax, simulated_data, n_days, location):
     """
     Generate multiple histograms of production or simulation data for a given location.
@@ -337,33 +457,42 @@ def plot_multiple_histograms(ax, simulated_data, n_days, location):
         f" {'day' if n_days == 1 else 'days'})")
 
 
+@instrument('plot')
 def plot_cdf(ax, simulated_data, n_days, location, include_clt=False):
     """
     Generate a Cumulative Distribution Function (CDF) line chart for production or simulation data.
 
     Parameters:
         ax (matplotlib Axes): The Axes object to draw the CDF chart onto.
-        simulated_data (array-like): Array containing production or simulation data.
+        simulated_data (array-like or summary): Array containing production or simulation data, a SimulationSummary,
+                                                or the exact distribution (see production_distribution).
         n_days (int): Number of days the data represents.
         location (str): Name of the location for which the data is plotted.
         include_clt (bool): Whether to include the Central Limit Theorem line on the plot. Default is False.
 
     This function generates a Cumulative Distribution Function (CDF) line chart for a given location and number of days.
-    The data is sorted, and the CDF is computed based on the sorted data.
+    The CDF is drawn through ECDF_POINTS quantiles (see ecdf_points), so the plot does not grow with the data.
+    For an exact distribution its CDF is plotted directly, without Monte Carlo noise.
     The x-axis represents production for the location over the specified number of days,
     and the y-axis represents the cumulative probability.
     If include_clt is True, the Central Limit Theorem (CLT) line is added to the plot.
     """
 
-    # Sort dataset
-    sorted_data = np.sort(simulated_data)
+    sorted_data, y_values = ecdf_points(simulated_data)
+    if is_summary(simulated_data):
+        mean_simulated = simulated_data.mean
+        std_simulated = simulated_data.std
+    else:
+        mean_simulated = np.mean(simulated_data)
+        std_simulated = np.std(simulated_data)
 
-    # Calculate y values
-    n = len(simulated_data)
-    y_values = np.arange(1, n + 1) / n
+    if isinstance(simulated_data, ProductionDistribution):
+        label = "Cumulative Distribution Function"
+    else:
+        label = "Empirical Cumulative Distribution Function"
 
     # Plot the CDF
-    ax.plot(sorted_data, y_values, label=f"Empirical Cumulative Distribution Function ({n_days}"
+    ax.plot(sorted_data, y_values, label=f"{label} ({n_days}"
                                          f" {'day' if n_days == 1 else 'days'})")
 
     # Set labels and title
@@ -373,10 +502,10 @@ def plot_cdf(ax, simulated_data, n_days, location, include_clt=False):
     ax.legend()
 
     if include_clt:
+        from scipy.stats import norm
+
         # Add CLT line to CDF plot
-        mean_simulated = np.mean(simulated_data)
-        std_simulated = np.std(simulated_data)
-        x_values = np.linspace(min(simulated_data), max(simulated_data), 100)
+        x_values = np.linspace(sorted_data[0], sorted_data[-1], 100)
         y_values = norm.cdf(x_values, mean_simulated, std_simulated)
         ax.plot(x_values, y_values, label='Central Limit Theorem', color='red', linestyle='--')
         ax.legend(loc='upper left')
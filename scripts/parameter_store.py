@@ -0,0 +1,192 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Default file of the parameter store
+PARAMETERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'output', 'parameters.json')
+
+# Loaded parameter files: path -> ((modification time, size), parameters)
+_loaded_files = {}
+
+
+@contextmanager
+def atomic_file(filename, mode='w'):
+    """
+    Context manager that gives an open temporary file in the folder of filename and renames it to filename when
+    the block ends without an error, so readers never see a half-written file, e.g.
+
+        with atomic_file('data.npz', 'wb') as f:
+            np.savez(f, **arrays)
+
+    Every call gets its own temporary file (tempfile.mkstemp), so concurrent writers (also threads of one process)
+    do not share it. After an error the temporary file is removed and filename is unchanged.
+    """
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temporary_filename = tempfile.mkstemp(dir=directory, prefix=f'{os.path.basename(filename)}.',
+                                                           suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, mode) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_filename, filename)
+    finally:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+
+
+def write_json_atomic(data, filename):
+    """
+    Write data to a JSON file via a temporary file and a rename (see atomic_file).
+
+    Parameters:
+        data: JSON-serializable data.
+        filename (str): The file to write.
+    """
+
+    with atomic_file(filename) as json_file:
+        json.dump(data, json_file, indent=4)
+
+
+@contextmanager
+def locked(filename):
+    """
+    Context manager that holds an exclusive lock on a file (via the sidecar file <filename>.lock), e.g. around
+    a read-modify-write. It waits until other processes and threads release the lock.
+    """
+
+    lock_filename = f'{os.path.abspath(filename)}.lock'
+    os.makedirs(os.path.dirname(lock_filename), exist_ok=True)
+    with open(lock_filename, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            # LK_LOCK gives up after 10 attempts of 1 s, so keep trying
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_parameters(filename=PARAMETERS_FILE):
+    """
+    Load the segment values of all locations, memoized as long as the file does not change.
+
+    Parameters:
+        filename (str): The parameter store file. Default is PARAMETERS_FILE.
+
+    Returns:
+        dict: The segment values per location, each with an extra 'version' and 'updated' (UTC timestamp).
+              The dictionary is shared between calls, so it should not be modified.
+
+    Each call only checks the modification time and size of the file; it is read and parsed again only
+    after it has been replaced (e.g. by save_parameters from another process).
+    """
+
+    path = os.path.abspath(filename)
+    if not os.path.exists(path):
+        return {}
+
+    status = os.stat(path)
+    signature = (status.st_mtime_ns, status.st_size)
+    loaded = _loaded_files.get(path)
+    if loaded is None or loaded[0] != signature:
+        with open(path, 'r') as json_file:
+            loaded = (signature, json.load(json_file))
+        _loaded_files[path] = loaded
+
+    return loaded[1]
+
+
+def params(location, filename=PARAMETERS_FILE):
+    """
+    Get the segment values of one location from the parameter store.
+
+    Parameters:
+        location (str): The location name.
+        filename (str): The parameter store file. Default is PARAMETERS_FILE.
+
+    Returns:
+        dict: The segment values of the location (as saved by calculate_and_save_segments_values),
+              with its 'version' and 'updated' timestamp.
+    """
+
+    parameters = load_parameters(filename)
+    if location not in parameters:
+        raise KeyError(f"No parameters for location '{location}' in {filename}.")
+
+    return parameters[location]
+
+
+def save_parameters(results, filename=PARAMETERS_FILE):
+    """
+    Add or replace the segment values of one or more locations in the parameter store.
+
+    Parameters:
+        results (dict): Segment values per location, e.g. the results of calculate_and_save_segments_values.
+        filename (str): The parameter store file. Default is PARAMETERS_FILE.
+
+    Returns:
+        dict: The saved entries per location, with their new 'version' and 'updated' timestamp.
+
+    The other locations in the store are kept. The file is locked during the read-modify-write, so concurrent
+    saves of different locations do not drop each other's values, and it is replaced atomically.
+    """
+
+    with locked(filename):
+        # Read the file itself, not the memoized copy: another writer may have replaced it just now
+        parameters = {}
+        if os.path.exists(filename):
+            with open(filename, 'r') as json_file:
+                parameters = json.load(json_file)
+        updated = datetime.now(timezone.utc).isoformat()
+
+        saved = {}
+        for location, values in results.items():
+            version = parameters.get(location, {}).get('version', 0) + 1
+            saved[location] = {**values, 'version': version, 'updated': updated}
+        parameters.update(saved)
+
+        write_json_atomic(parameters, filename)
+
+    return saved
+
+
+def import_parameter_files(filenames, filename=PARAMETERS_FILE):
+    """
+    Add the locations of separate JSON files (e.g. data/output/BRU.json and STO.json) to the parameter store.
+
+    Parameters:
+        filenames (list): The JSON files made by calculate_and_save_segments_values.
+        filename (str): The parameter store file. Default is PARAMETERS_FILE.
+
+    Returns:
+        dict: The saved entries per location.
+    """
+
+    results = {}
+    for location_filename in filenames:
+        with open(location_filename, 'r') as json_file:
+            results.update(json.load(json_file))
+
+    return save_parameters(results, filename)
@@ -0,0 +1,288 @@
+"""
+Command-line entry point for the production pipeline: load -> segment -> fit -> simulate.
+
+Examples:
+    python scripts/pipeline.py --locations BRU STO --horizons 1 7 91 365 --workers 4 --seed 1 --output results.csv
+    python scripts/pipeline.py --output-dir data/output          (replace the committed <location>.json files)
+    python scripts/pipeline.py --parameter-store data/output/parameters.json   (also save the values to the store)
+    python scripts/pipeline.py --from-store --format json          (simulate all locations of the parameter store)
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from parameter_store import PARAMETERS_FILE, load_parameters
+from read_files import read_production
+from segment_calculations import calculate_and_save_segments_values, create_all_segments, select_thresholds_2
+from simulate import NUM_VALUES, segment_parameters, simulate_parallel
+
+# Default folders of the input data (one subfolder of YYYYMMDD.json files per location) and the output files.
+# The output goes to the (ignored) cache folder and the parameter store is only written when it is given, so a run
+# does not touch data/output.
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'input', 'data_production',
+                         'daily_production')
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'pipeline')
+
+# Defaults of the command-line options
+HORIZONS = [1, 7, 91, 365]
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+THRESHOLD_1 = 10**(-8)
+
+logger = logging.getLogger('pipeline')
+
+
+@contextmanager
+def timed(stage, timings):
+    """
+    Measure the wall time of a stage, log it and add it to timings (stage name -> seconds).
+    """
+
+    start = time.perf_counter()
+    yield
+    timings[stage] = time.perf_counter() - start
+    logger.info("Stage '%s' took %.3f s", stage, timings[stage])
+
+
+def parse_threshold(value):
+    """
+    Parse a threshold_2 option like 'BRU=750' into ('BRU', 750.0).
+    """
+
+    location, separator, threshold = value.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected LOCATION=VALUE, got '{value}'")
+
+    return location, float(threshold)
+
+
+def load_production(input_dir, locations=None, max_workers=None):
+    """
+    Load the production data of the locations (all subfolders of input_dir by default), without maintenance days.
+    max_workers is the number of threads that read the files (None reads without threads).
+
+    Returns:
+        DataFrame: One row per day with the columns of read_files.PRODUCTION_SCHEMA.
+    """
+
+    if not locations:
+        locations = sorted(entry.name for entry in os.scandir(input_dir) if entry.is_dir())
+    directories = {location: os.path.join(input_dir, location) for location in locations}
+
+    return read_production(directories, filters={'maintenance': 'No'}, max_workers=max_workers)
+
+
+def segment_locations(production, threshold_1=THRESHOLD_1, thresholds_2=None):
+    """
+    Segment the production data of every location.
+
+    Parameters:
+        production (DataFrame): The production data (columns 'location' and 'production').
+        threshold_1 (float): The first production threshold.
+        thresholds_2 (dict or None): threshold_2 per location. Locations without one get an automatic threshold
+                                     (see select_thresholds_2).
+
+    Returns:
+        tuple: The thresholds (threshold_1, threshold_2) per location and the segments per location
+               (see create_all_segments).
+    """
+
+    locations = [str(location) for location in pd.unique(production['location'])]
+    thresholds_2 = {location: value for location, value in (thresholds_2 or {}).items() if location in locations}
+    missing = [location for location in locations if location not in thresholds_2]
+    if missing:
+        thresholds_2.update(select_thresholds_2(production, threshold_1, locations=missing))
+
+    thresholds = {location: (threshold_1, thresholds_2[location]) for location in locations}
+
+    return thresholds, create_all_segments(production, thresholds)
+
+
+def fit_locations(thresholds, segments, output_dir=OUTPUT_DIR, parameter_store=None):
+    """
+    Fit the segment values of every location and save them.
+
+    Parameters:
+        thresholds (dict): The thresholds (threshold_1, threshold_2) per location.
+        segments (dict): The segments per location (see create_all_segments).
+        output_dir (str): Folder for the <location>.json files.
+        parameter_store (str or None): The parameter store file to save the results to as well.
+
+    Returns:
+        dict: The segment values per location.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    parameters = {}
+    for location, (share_1, share_2, share_3, segment_1, segment_2, segment_3) in segments.items():
+        filename = os.path.join(output_dir, f'{location}.json')
+        parameters.update(calculate_and_save_segments_values(location, *thresholds[location], share_1, segment_2,
+                                                             segment_3, share_2, share_3, filename, parameter_store))
+
+    return parameters
+
+
+def simulate_locations_summary(parameters, horizons=HORIZONS, quantiles=QUANTILES, num_values=NUM_VALUES, seed=None,
+                               workers=None):
+    """
+    Simulate every location and horizon and summarize the results.
+
+    Parameters:
+        parameters (dict): The segment values per location.
+        horizons (list): Numbers of days to simulate.
+        quantiles (list): Quantiles to report.
+        num_values (int): Number of simulated trials per location and horizon.
+        seed (int or None): Seed of the whole run; every location and horizon gets its own stream.
+        workers (int or None): Number of processes of the pool that all runs share (see simulate_parallel).
+
+    Returns:
+        DataFrame: One row per location and horizon with count, mean, std, minimum, maximum and the quantiles.
+    """
+
+    runs = [(location, n_days) for location in parameters for n_days in horizons]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(runs))
+
+    # One pool of processes for all runs (None runs in this process)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 and runs else None
+    rows = []
+    try:
+        for (location, n_days), seed_sequence in zip(runs, seed_sequences):
+            summary = simulate_parallel(*segment_parameters(parameters[location]), n_days, num_values=num_values,
+                                        seed=seed_sequence, workers=workers, summarize=True, executor=executor)
+            row = {'location': location, 'n_days': n_days, 'count': summary.count, 'mean': summary.mean,
+                   'std': summary.std, 'minimum': summary.minimum, 'maximum': summary.maximum}
+            for q, value in zip(quantiles, summary.quantile(quantiles)):
+                row[f'q{100 * q:g}'] = value
+            rows.append(row)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return pd.DataFrame(rows)
+
+
+def write_results(results, output, output_format):
+    """
+    Write the results to a file (or to stdout when output is None or '-') as CSV or JSON records.
+    """
+
+    if output_format == 'csv':
+        text = results.to_csv(index=False)
+    else:
+        text = json.dumps(results.to_dict(orient='records'), indent=4) + '\n'
+
+    if output in (None, '-'):
+        sys.stdout.write(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text)
+
+
+def parse_arguments(argv=None):
+    """
+    Parse the command-line arguments (sys.argv by default).
+    """
+
+    parser = argparse.ArgumentParser(description='Load, segment, fit and simulate the production of locations.')
+    parser.add_argument('--locations', nargs='+', help='Locations to run (default: all locations).')
+    parser.add_argument('--horizons', nargs='+', type=int, default=HORIZONS, help='Numbers of days to simulate.')
+    parser.add_argument('--quantiles', nargs='+', type=float, default=QUANTILES, help='Quantiles to report.')
+    parser.add_argument('--num-values', type=int, default=NUM_VALUES, help='Number of simulated trials.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes of the simulation (default: all CPUs).')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Number of threads that read the input files (default: no threads).')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the simulation (default: random).')
+    parser.add_argument('--input-dir', default=INPUT_DIR, help='Folder with one subfolder per location.')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='Folder for the <location>.json segment values (default: data/cache/pipeline).')
+    parser.add_argument('--parameter-store', default=None,
+                        help='The parameter store file to save the fitted values to (default: none) and to read '
+                             'with --from-store (default: data/output/parameters.json).')
+    parser.add_argument('--from-store', action='store_true',
+                        help='Skip load, segment and fit: simulate with the segment values of the parameter store.')
+    parser.add_argument('--threshold-1', type=float, default=THRESHOLD_1, help='The first production threshold.')
+    parser.add_argument('--threshold-2', nargs='+', type=parse_threshold, metavar='LOCATION=VALUE',
+                        help='threshold_2 per location (default: selected automatically).')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help='Format of the results.')
+    parser.add_argument('--output', default=None, help='File for the results (default: stdout).')
+    parser.add_argument('--profile', default=None,
+                        help='File for a CSV report of the wall time, CPU time, peak memory and counts per function.')
+    parser.add_argument('--log-level', default='INFO', help='Logging level (e.g. INFO or WARNING).')
+
+    return parser.parse_args(argv)
+
+
+def run_stages(args, timings):
+    """
+    Run the stages of the pipeline with the parsed command-line arguments, adding their wall times to timings.
+
+    Returns:
+        DataFrame: The results (see simulate_locations_summary).
+    """
+
+    if args.from_store:
+        parameter_store = args.parameter_store or PARAMETERS_FILE
+        parameters = load_parameters(parameter_store)
+        if args.locations:
+            missing = [location for location in args.locations if location not in parameters]
+            if missing:
+                raise SystemExit(f"No parameters for {', '.join(missing)} in {parameter_store}.")
+            parameters = {location: parameters[location] for location in args.locations}
+    else:
+        with timed('load', timings):
+            production = load_production(args.input_dir, args.locations, args.threads)
+        logger.info('Loaded %d days of %d locations', len(production), production['location'].nunique())
+
+        with timed('segment', timings):
+            thresholds, segments = segment_locations(production, args.threshold_1, dict(args.threshold_2 or []))
+
+        with timed('fit', timings):
+            parameters = fit_locations(thresholds, segments, args.output_dir, args.parameter_store)
+
+    with timed('simulate', timings):
+        results = simulate_locations_summary(parameters, args.horizons, args.quantiles, args.num_values, args.seed,
+                                             args.workers)
+
+    with timed('write', timings):
+        write_results(results, args.output, args.format)
+
+    return results
+
+
+def main(argv=None):
+    """
+    Run the pipeline with command-line arguments and return the results.
+    """
+
+    args = parse_arguments(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    timings = {}
+    if args.profile:
+        instrumentation.reset()
+        instrumentation.enable()
+
+    # Also after an error in a stage: stop the instrumentation (and tracemalloc) and drop its records
+    try:
+        results = run_stages(args, timings)
+        logger.info('Total time %.3f s', sum(timings.values()))
+        if args.profile:
+            instrumentation.report().to_csv(args.profile)
+    finally:
+        if args.profile:
+            instrumentation.disable()
+            instrumentation.reset()
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
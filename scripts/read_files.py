@@ -1,27 +1,304 @@
+import numpy as np
 import pandas as pd
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 
+from instrumentation import instrument
+from parameter_store import atomic_file
 
-def read_json_files(directory_path, location):
+# Data types of the columns in the daily production files
+# (the production columns stay 'object': they are not always numeric, e.g. during maintenance)
+COLUMN_DTYPES = {
+    'DoW': 'object',
+    'hour': 'int64',
+    'minute': 'int64',
+    'date': 'object',
+    'maintenance': 'object',
+    'prod_loss': 'object',
+    'prod_loss_perc': 'object',
+    'production': 'object'
+}
+
+# Schema of the typed production frame (see read_production): the data type per column to keep.
+# 'date' is parsed from the file name (YYYYMMDD.json), 'location' comes from the folder.
+PRODUCTION_SCHEMA = {
+    'date': 'datetime64[ns]',
+    'DoW': 'category',
+    'maintenance': 'category',
+    'prod_loss': 'float32',
+    'prod_loss_perc': 'float32',
+    'production': 'float32',
+    'location': 'category'
+}
+
+# Names of the arrays in a cache file that describe the source files (one per row)
+CACHE_FILES = '__files__'
+CACHE_MTIMES = '__mtimes__'
+CACHE_SIZES = '__sizes__'
+CACHE_COLUMNS = '__columns__'
+
+
+def list_json_files(directory_path):
+    """
+    List the JSON files in a folder, sorted by name (i.e. by date for YYYYMMDD.json files).
+
+    Args:
+        directory_path (str): The path to the folder containing JSON files.
+
+    Returns:
+        list: The full paths of the JSON files.
+    """
+    return [os.path.join(directory_path, filename)
+            for filename in sorted(os.listdir(directory_path))
+            if filename.endswith(".json")]
+
+
+def read_json_file(full_path):
+    """
+    Read one JSON file into a plain record.
+
+    Args:
+        full_path (str): The path to the JSON file.
+
+    Returns:
+        dict: The content of the JSON file.
+    """
+    with open(full_path, 'rb') as f:
+        return json.loads(f.read())
+
+
+@instrument('load', count=len)
+def read_locations(directories, max_workers=None):
+    """
+    Function to read the JSON files of several locations and create one DataFrame
+
+    Args:
+        directories (dict): The path to the folder containing JSON files, per location name.
+        max_workers (int or None): Number of threads to read the files with. Default is None (no threads).
+
+    Returns:
+        pandas.DataFrame: A DataFrame that contains all the data from the JSON files,
+                          with an extra column 'location'.
+    """
+    full_paths = []
+    locations = []
+    for location, directory_path in directories.items():
+        location_paths = list_json_files(directory_path)
+        full_paths.extend(location_paths)
+        locations.extend([location] * len(location_paths))
+
+    # Parse all files into plain records, then build the DataFrame once
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            records = list(executor.map(read_json_file, full_paths))
+    else:
+        records = [read_json_file(full_path) for full_path in full_paths]
+
+    df = pd.DataFrame.from_records(records)
+    df = df.astype({column: dtype for column, dtype in COLUMN_DTYPES.items() if column in df.columns})
+    df['location'] = pd.Series(locations, index=df.index, dtype='object')  # Add 'location' column
+    return df
+
+
+def read_json_files(directory_path, location, max_workers=None):
     """
     Function to read JSON files and create DataFrame
 
     Args:
         directory_path (str): The path to the folder containing JSON files.
         location (str): The name of the location to add to the 'location' column.
+        max_workers (int or None): Number of threads to read the files with. Default is None (no threads).
 
     Returns:
         pandas.DataFrame: A DataFrame that contains all the data from the JSON files,
                           with an extra column 'location'.
     """
-    dataframes = []
-    for filename in os.listdir(directory_path):
-        if filename.endswith(".json"):
-            full_path = os.path.join(directory_path, filename)
-            with open(full_path, 'r') as f:
-                json_data = json.load(f)
-                df = pd.DataFrame([json_data])
-                df['location'] = location  # Add 'location' column
-                dataframes.append(df)
-    return pd.concat(dataframes, ignore_index=True)
+    return read_locations({location: directory_path}, max_workers)
+
+
+@instrument('load', count=len)
+def read_production(directories, schema=PRODUCTION_SCHEMA, filters=None, max_workers=None):
+    """
+    Function to read the JSON files of several locations into one compact, typed DataFrame
+
+    Args:
+        directories (dict): The path to the folder containing JSON files, per location name.
+        schema (dict): The data type per column to keep (see PRODUCTION_SCHEMA). Other columns are dropped.
+                       Numeric columns are converted like pd.to_numeric(errors='coerce').
+        filters (dict or None): Only keep records whose value is in the allowed value(s) of each column,
+                                e.g. {'maintenance': 'No'}. Default is None (keep all records).
+        max_workers (int or None): Number of threads to read the files with. Default is None (no threads).
+
+    Returns:
+        pandas.DataFrame: A DataFrame with one row per kept JSON file and the columns of the schema.
+
+    The filters are applied to the records before any row is built, and every column is converted
+    to its data type only once, so no intermediate object DataFrame or filtered copy is made.
+    """
+    allowed_values = {column: set(values) if isinstance(values, (list, tuple, set)) else {values}
+                      for column, values in (filters or {}).items()}
+
+    full_paths = []
+    locations = []
+    for location, directory_path in directories.items():
+        location_paths = list_json_files(directory_path)
+        full_paths.extend(location_paths)
+        locations.extend([location] * len(location_paths))
+
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            records = executor.map(read_json_file, full_paths)
+    else:
+        records = map(read_json_file, full_paths)
+
+    # Build the columns of the schema from the records that pass the filters
+    columns = {column: [] for column in schema}
+    n_rows = 0
+    for full_path, location, record in zip(full_paths, locations, records):
+        record['date'] = os.path.splitext(os.path.basename(full_path))[0]
+        record['location'] = location
+        if all(record.get(column) in values for column, values in allowed_values.items()):
+            for column, values in columns.items():
+                values.append(record.get(column))
+            n_rows += 1
+
+    df = pd.DataFrame(index=pd.RangeIndex(n_rows))
+    for column, dtype in schema.items():
+        values = pd.Series(columns[column], index=df.index, dtype='object')
+        if column == 'date':
+            df[column] = pd.to_datetime(values, format='%Y%m%d').astype(dtype)
+        elif dtype in ('category', 'object'):
+            df[column] = values.astype(dtype)
+        else:
+            df[column] = pd.to_numeric(values, errors='coerce').astype(dtype)
+    return df
+
+
+def scan_json_files(directory_path):
+    """
+    List the JSON files in a folder with their modification time and size, sorted by name.
+
+    Args:
+        directory_path (str): The path to the folder containing JSON files.
+
+    Returns:
+        tuple: numpy arrays with the file names, modification times (ns) and sizes (bytes).
+    """
+    entries = sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                     for entry in os.scandir(directory_path)
+                     if entry.name.endswith(".json") and entry.is_file())
+    names = np.array([entry[0] for entry in entries], dtype=str)
+    mtimes = np.array([entry[1] for entry in entries], dtype=np.int64)
+    sizes = np.array([entry[2] for entry in entries], dtype=np.int64)
+    return names, mtimes, sizes
+
+
+def load_cache(cache_path):
+    """
+    Load a cache file written by save_cache.
+
+    Args:
+        cache_path (str): The path to the .npz cache file.
+
+    Returns:
+        tuple: The cached DataFrame (without 'location') and the file names, modification times and sizes
+               of its rows, or None if there is no cache file.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    with np.load(cache_path, allow_pickle=True) as cache:
+        df = pd.DataFrame({column: cache[column] for column in cache[CACHE_COLUMNS].tolist()})
+        return df, cache[CACHE_FILES], cache[CACHE_MTIMES], cache[CACHE_SIZES]
+
+
+def save_cache(cache_path, df, names, mtimes, sizes):
+    """
+    Save a DataFrame column by column with the file name, modification time and size of each row.
+    The file is written to a temporary file first and then renamed (see parameter_store.atomic_file), so a cache
+    file is never half-written.
+
+    Args:
+        cache_path (str): The path to the .npz cache file.
+        df (pandas.DataFrame): The parsed data (one row per source file).
+        names, mtimes, sizes (numpy.ndarray): The source file of each row.
+    """
+    arrays = {column: df[column].to_numpy() for column in df.columns}
+    arrays[CACHE_COLUMNS] = np.array(df.columns, dtype=str)
+    arrays[CACHE_FILES] = names
+    arrays[CACHE_MTIMES] = mtimes
+    arrays[CACHE_SIZES] = sizes
+
+    with atomic_file(cache_path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+@instrument('load', count=len)
+def read_json_files_cached(directory_path, location, cache_dir, max_workers=None):
+    """
+    Function to read JSON files and create DataFrame, with an incremental cache per location
+
+    Args:
+        directory_path (str): The path to the folder containing JSON files.
+        location (str): The name of the location to add to the 'location' column.
+        cache_dir (str): The folder for the cache files (one '<location>.npz' per location).
+        max_workers (int or None): Number of threads to read new files with. Default is None (no threads).
+
+    Returns:
+        pandas.DataFrame: The same DataFrame as read_json_files.
+
+    The cache keeps the parsed data column by column, together with the name, modification time and size
+    of the source file of every row. Only new or changed files are parsed; when nothing has changed the
+    DataFrame comes straight from the cache.
+    """
+    cache_path = os.path.join(cache_dir, f'{location}.npz')
+    names, mtimes, sizes = scan_json_files(directory_path)
+    cache = load_cache(cache_path)
+
+    if cache is None:
+        cached_df, cached_names = pd.DataFrame(), np.array([], dtype=str)
+        cached_mtimes = cached_sizes = np.array([], dtype=np.int64)
+    else:
+        cached_df, cached_names, cached_mtimes, cached_sizes = cache
+
+    # Rows of the cache whose source file still exists unchanged
+    cached_keys = pd.MultiIndex.from_arrays([cached_names, cached_mtimes, cached_sizes])
+    current_keys = pd.MultiIndex.from_arrays([names, mtimes, sizes])
+    keep = cached_keys.isin(current_keys)
+    new = ~current_keys.isin(cached_keys)
+
+    if keep.all() and not new.any():
+        df = cached_df
+    else:
+        new_paths = [os.path.join(directory_path, name) for name in names[new]]
+        if max_workers:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                records = list(executor.map(read_json_file, new_paths))
+        else:
+            records = [read_json_file(full_path) for full_path in new_paths]
+
+        # Combine the unchanged rows with the new ones, in file name order
+        df = pd.concat([cached_df[keep], pd.DataFrame.from_records(records)], ignore_index=True)
+        order = np.argsort(np.concatenate([cached_names[keep], names[new]]), kind='stable')
+        df = df.iloc[order].reset_index(drop=True)
+        save_cache(cache_path, df, names, mtimes, sizes)
+
+    df = df.astype({column: dtype for column, dtype in COLUMN_DTYPES.items() if column in df.columns})
+    df['location'] = pd.Series(location, index=df.index, dtype='object')  # Add 'location' column
+    return df
+
+
+def read_locations_cached(directories, cache_dir, max_workers=None):
+    """
+    Function to read the JSON files of several locations and create one DataFrame, with an incremental cache
+
+    Args:
+        directories (dict): The path to the folder containing JSON files, per location name.
+        cache_dir (str): The folder for the cache files (see read_json_files_cached).
+        max_workers (int or None): Number of threads to read new files with. Default is None (no threads).
+
+    Returns:
+        pandas.DataFrame: The same DataFrame as read_locations.
+    """
+    return pd.concat([read_json_files_cached(directory_path, location, cache_dir, max_workers)
+                      for location, directory_path in directories.items()], ignore_index=True)
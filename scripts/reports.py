@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from make_a_chart import calculate_maximum, draw_segment_distributions, plot_cdf, plot_multiple_histograms
+from parameter_store import atomic_file, write_json_atomic
+from segment_calculations import create_all_segments
+from simulate import NUM_VALUES, PARAMETER_KEYS, segment_parameters, simulate
+
+# Available chart types: segments per location, histogram and CDF per location and horizon
+CHART_TYPES = ['segments', 'histogram', 'cdf']
+
+# Default horizons of a report (1 day, 1 week, 3 months and 1 year)
+HORIZONS = (1, 7, 91, 365)
+
+# File in the report folder with the input key of every rendered figure
+MANIFEST_FILE = 'manifest.json'
+
+
+class ReportFigure:
+    """
+    One figure of a report: a chart type for a location (and a horizon), with everything it is drawn from.
+
+    Attributes:
+        location (str): The location name.
+        chart_type (str): One of CHART_TYPES.
+        params (dict): Segment values of the location (e.g. from the parameter store).
+        n_days (int or None): The horizon (None for the segment chart).
+        figure_format (str): 'png' or 'svg'.
+        num_values (int): Number of simulated trials.
+        seed (int): Seed of the simulation.
+        segments (tuple or None): The segment 1, 2 and 3 DataFrames (only for the segment chart).
+        maximum (int or None): The maximum value for the x-axis (only for the segment chart).
+    """
+
+    def __init__(self, location, chart_type, params, n_days=None, figure_format='png', num_values=NUM_VALUES,
+                 seed=0, segments=None, maximum=None):
+        if chart_type not in CHART_TYPES:
+            raise ValueError(f"Unknown chart type '{chart_type}', choose one of {CHART_TYPES}.")
+        self.location = location
+        self.chart_type = chart_type
+        self.params = params
+        self.n_days = n_days
+        self.figure_format = figure_format
+        self.num_values = num_values
+        self.seed = seed
+        self.segments = segments
+        self.maximum = maximum
+
+    @property
+    def filename(self):
+        horizon = '' if self.n_days is None else f'_{self.n_days}d'
+        return f'{self.location}_{self.chart_type}{horizon}.{self.figure_format}'
+
+    def key(self):
+        """
+        Calculate the SHA-256 hash of everything the figure is drawn from.
+
+        A figure only needs to be rendered again when its key changes (e.g. new segment values or new data).
+        """
+
+        content = {
+            'chart_type': self.chart_type,
+            'format': self.figure_format,
+            'params': {key: float(self.params[key]) for key in PARAMETER_KEYS},
+            'thresholds': [float(self.params.get('threshold_1', np.nan)), float(self.params.get('threshold_2', np.nan))],
+            'n_days': self.n_days,
+            'num_values': int(self.num_values),
+            'seed': self.seed,
+            'maximum': self.maximum
+        }
+        key = hashlib.sha256(json.dumps(content, sort_keys=True).encode())
+        for segment in self.segments or ():
+            key.update(np.ascontiguousarray(segment['production'].to_numpy(dtype=float)).tobytes())
+
+        return key.hexdigest()
+
+    def draw(self, simulated_data=None):
+        """
+        Draw the figure on a new matplotlib Figure (without pyplot, so no display is needed).
+
+        Parameters:
+            simulated_data (numpy.ndarray or None): The simulated production of the horizon
+                                                    (only for the histogram and the CDF).
+
+        Returns:
+            matplotlib.figure.Figure: The figure.
+        """
+
+        if self.chart_type == 'segments':
+            fig = Figure(figsize=(25, 4))
+            axes = fig.subplots(1, 3, gridspec_kw={'width_ratios': [4, 4, 4]})
+            draw_segment_distributions(axes,
+                                       self.segments[0],
+                                       self.segments[1], self.params['lower_bound_s2'], self.params['upper_bound_s2'],
+                                       self.segments[2], self.params['param1_s3'], self.params['param2_s3'],
+                                       self.location,
+                                       self.params['threshold_1'], self.params['threshold_2'], self.maximum)
+            fig.subplots_adjust(wspace=0.2)
+            return fig
+
+        fig = Figure(figsize=(7.5, 5), layout='tight')
+        ax = fig.subplots()
+        if self.chart_type == 'histogram':
+            plot_multiple_histograms(ax, simulated_data, self.n_days, self.location)
+        else:
+            plot_cdf(ax, simulated_data, self.n_days, self.location, include_clt=True)
+
+        return fig
+
+
+def render_figures(task):
+    """
+    Render a list of figures of one location to files (used by ReportRenderer, also in worker processes).
+
+    Parameters:
+        task (tuple): The report folder and the list of ReportFigure objects.
+
+    Returns:
+        dict: The key of every rendered file name.
+
+    Every horizon is simulated once, for all figures that need it, with the seed of the figure.
+    """
+
+    output_dir, figures = task
+    simulations = {}
+    keys = {}
+
+    for figure in figures:
+        simulated_data = None
+        if figure.n_days is not None:
+            settings = (figure.n_days, figure.num_values, figure.seed)
+            if settings not in simulations:
+                simulations[settings] = simulate(*segment_parameters(figure.params), figure.n_days,
+                                                 num_values=figure.num_values, rng=figure.seed)
+            simulated_data = simulations[settings]
+
+        path = os.path.join(output_dir, figure.filename)
+        with atomic_file(path, 'wb') as image_file:
+            figure.draw(simulated_data).savefig(image_file, format=figure.figure_format)
+        keys[figure.filename] = figure.key()
+
+    return keys
+
+
+class ReportRenderer:
+    """
+    Render the charts of many locations and horizons to image files, in parallel and without a display.
+
+    Every location x horizon x chart type becomes one file in output_dir (see ReportFigure.filename).
+    The key of every rendered figure is kept in MANIFEST_FILE, so figures whose inputs did not change
+    are skipped the next time. The locations are spread over a pool of processes.
+
+    Example:
+        renderer = ReportRenderer('../data/output/report', formats=('png', 'svg'))
+        renderer.render(load_parameters(), combined_df_cleaned)
+    """
+
+    def __init__(self, output_dir, horizons=HORIZONS, chart_types=CHART_TYPES, formats=('png',),
+                 num_values=NUM_VALUES, seed=0, workers=None):
+        self.output_dir = output_dir
+        self.horizons = horizons
+        self.chart_types = chart_types
+        self.formats = formats
+        self.num_values = num_values
+        self.seed = seed
+        self.workers = workers
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.output_dir, MANIFEST_FILE)
+
+    def load_manifest(self):
+        """
+        Load the key of every rendered file name (empty if nothing was rendered yet).
+        """
+
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r') as json_file:
+            return json.load(json_file)
+
+    def figures(self, parameters, production=None):
+        """
+        List the figures of a report.
+
+        Parameters:
+            parameters (dict): Segment values per location, e.g. from the parameter store.
+            production (DataFrame or None): The production data (columns 'location' and 'production'),
+                                            needed for the segment charts. Default is None (no segment charts).
+
+        Returns:
+            list: The ReportFigure objects.
+        """
+
+        segments = {}
+        if production is not None and 'segments' in self.chart_types:
+            thresholds = {location: (params['threshold_1'], params['threshold_2'])
+                          for location, params in parameters.items()}
+            for location, (_, _, _, *location_segments) in create_all_segments(production, thresholds).items():
+                segments[location] = tuple(segment[['production']] for segment in location_segments)
+
+        figures = []
+        for location, params in parameters.items():
+            for figure_format in self.formats:
+                if location in segments:
+                    figures.append(ReportFigure(location, 'segments', params, figure_format=figure_format,
+                                                segments=segments[location],
+                                                maximum=calculate_maximum(production, location)))
+                for n_days in self.horizons:
+                    for chart_type in self.chart_types:
+                        if chart_type != 'segments':
+                            figures.append(ReportFigure(location, chart_type, params, n_days, figure_format,
+                                                        self.num_values, self.seed))
+
+        return figures
+
+    def render(self, parameters, production=None, force=False):
+        """
+        Render the figures of a report whose inputs changed since the last time.
+
+        Parameters:
+            parameters (dict): Segment values per location, e.g. from the parameter store.
+            production (DataFrame or None): The production data for the segment charts. Default is None.
+            force (bool): Render all figures, also the unchanged ones. Default is False.
+
+        Returns:
+            dict: The rendered and the skipped file names ('rendered' and 'skipped').
+        """
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = self.load_manifest()
+
+        # Figures to render, grouped per location (every horizon is simulated once per location)
+        tasks = {}
+        skipped = []
+        for figure in self.figures(parameters, production):
+            path = os.path.join(self.output_dir, figure.filename)
+            if not force and manifest.get(figure.filename) == figure.key() and os.path.exists(path):
+                skipped.append(figure.filename)
+            else:
+                tasks.setdefault(figure.location, []).append(figure)
+        tasks = [(self.output_dir, figures) for figures in tasks.values()]
+
+        if self.workers == 1 or len(tasks) <= 1:
+            results = [render_figures(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(render_figures, tasks))
+
+        rendered = []
+        for keys in results:
+            manifest.update(keys)
+            rendered.extend(keys)
+        write_json_atomic(manifest, self.manifest_path)
+
+        return {'rendered': rendered, 'skipped': skipped}
@@ -0,0 +1,94 @@
+import numpy as np
+
+# Available sampling methods
+SAMPLERS = ['pseudo', 'antithetic', 'stratified', 'sobol']
+
+
+class UniformSampler:
+    """
+    Source of uniform random numbers in [0, 1) for simulating a number of days per trial.
+
+    Samplers:
+        pseudo: plain pseudo-random numbers.
+        antithetic: every trial u is paired with the trial 1 - u, so their segment choices and
+                    values are mirrored (chunks should have an even size).
+        stratified: Latin hypercube sampling; per day the trials of a chunk are spread evenly over [0, 1),
+                    so the segment choice of every day is stratified over the shares of the segments.
+        sobol: scrambled Sobol sequence (quasi-Monte Carlo) with one dimension per day
+               (chunks and totals should be powers of 2; other chunk sizes are cut from the next power of 2).
+    """
+
+    def __init__(self, sampler, n_days, rng=None):
+        if sampler not in SAMPLERS:
+            raise ValueError(f"Unknown sampler '{sampler}', choose one of {SAMPLERS}.")
+        self.sampler = sampler
+        self.n_days = n_days
+        self.rng = np.random.default_rng(rng)
+        if sampler == 'sobol':
+            from scipy.stats import qmc
+
+            self.engine = qmc.Sobol(d=n_days, scramble=True, seed=self.rng)
+
+    def random(self, size):
+        """
+        Draw uniform random numbers for a chunk of trials.
+
+        Parameters:
+            size (int): Number of trials in the chunk.
+
+        Returns:
+            numpy.ndarray: Array of shape (size, n_days).
+        """
+
+        if self.sampler == 'antithetic':
+            half = self.rng.random(((size + 1) // 2, self.n_days))
+            return np.concatenate([half, 1.0 - half])[:size]
+
+        if self.sampler == 'stratified':
+            strata = self.rng.permuted(np.tile(np.arange(size), (self.n_days, 1)), axis=1).T
+            return (strata + self.rng.random((size, self.n_days))) / size
+
+        if self.sampler == 'sobol':
+            # Draw a power of 2 of points (the balance of the sequence needs it) and keep the first size points
+            return self.engine.random(1 << (size - 1).bit_length())[:size]
+
+        return self.rng.random((size, self.n_days))
+
+
+def daily_production(uniform_values, share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3):
+    """
+    Transform uniform random numbers into daily production values (inverse transform sampling).
+
+    Parameters:
+        uniform_values (numpy.ndarray): Uniform random numbers in [0, 1).
+        share_1 (float): Share of production for segment 1.
+        share_2 (float): Share of production for segment 2.
+        lower_bound_s2 (float): Lower bound threshold for segment 2.
+        upper_bound_s2 (float): Upper bound threshold for segment 2.
+        param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
+        param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
+
+    Returns:
+        numpy.ndarray: Production values with the same shape as uniform_values.
+
+    One uniform number per day chooses the segment and its value: u < share_1 gives 0, the next share_2 of
+    [0, 1) is mapped linearly on the uniform range and the rest on the normal distribution. Because the
+    mapping is monotone, the structure of antithetic, stratified and Sobol samples carries over to production.
+    """
+
+    from scipy.special import ndtri
+
+    share_3 = max(1.0 - share_1 - share_2, np.finfo(float).tiny)
+    boundary = share_1 + share_2
+
+    # Segment 3 for every value first, then overwrite segments 2 and 1
+    relative = np.clip((uniform_values - boundary) / share_3, 1e-16, 1.0 - 1e-16)
+    production = param1_s3 + param2_s3 * ndtri(relative)
+
+    in_segment_2 = uniform_values < boundary
+    if share_2 > 0:
+        production[in_segment_2] = (lower_bound_s2 + (upper_bound_s2 - lower_bound_s2)
+                                    * (uniform_values[in_segment_2] - share_1) / share_2)
+    production[uniform_values < share_1] = 0.0
+
+    return production
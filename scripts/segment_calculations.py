@@ -1,5 +1,90 @@
 import json
-from scipy.stats import norm
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrument
+from parameter_store import atomic_file, save_parameters
+from summaries import RunningMoments
+
+# Upper bound for the memory of the goodness-of-fit arrays of one chunk of threshold_2 candidates (in bytes)
+MAX_SWEEP_BYTES = 2**25
+
+
+def segmented_rows(results):
+    """
+    Number of rows in the segments of create_all_segments (used by the instrumentation).
+    """
+    return sum(len(segment) for result in results.values() for segment in result[3:])
+
+
+def assign_segments(df, thresholds):
+    """
+    Assign the segment of every row in one vectorized pass over all locations.
+
+    Parameters:
+        df (DataFrame): The DataFrame with the data (columns 'location' and 'production').
+        thresholds (dict): The production thresholds (threshold_1, threshold_2) per location.
+
+    Returns:
+        tuple: An array with the location number of every row (the position in thresholds, -1 for other locations)
+               and an array with the segment of every row (1, 2 or 3; 0 for other locations and missing production).
+    """
+    locations = list(thresholds)
+    location_codes = pd.Categorical(df['location'], categories=locations).codes.astype(np.int64)
+    production = df['production'].to_numpy(dtype=float, na_value=np.nan)
+
+    # Thresholds of the location of every row
+    threshold_1 = np.array([thresholds[location][0] for location in locations], dtype=float)[location_codes]
+    threshold_2 = np.array([thresholds[location][1] for location in locations], dtype=float)[location_codes]
+
+    segments = 1 + (production >= threshold_1).astype(np.int8) + (production >= threshold_2).astype(np.int8)
+    segments[(location_codes < 0) | np.isnan(production)] = 0
+
+    return location_codes, segments
+
+
+@instrument('segment', count=segmented_rows)
+def create_all_segments(df, thresholds):
+    """
+    Create segments for all locations at once, based on the production thresholds per location.
+
+    Parameters:
+        df (DataFrame): The DataFrame with the data
+        thresholds (dict): The production thresholds (threshold_1, threshold_2) per location,
+                           e.g. {'BRU': (10**(-8), 750), 'STO': (10**(-8), 150)}.
+
+    Returns:
+        dict: Per location the same tuple as create_segments:
+              (share_1, share_2, share_3, segment_1, segment_2, segment_3).
+
+    The segments of all rows are assigned in a single pass (see assign_segments). The rows are then
+    grouped by location and segment with one stable sort, so every segment keeps the original row order.
+    The cost grows with the number of rows, not with the number of locations times the number of rows.
+    """
+    locations = list(thresholds)
+    location_codes, segments = assign_segments(df, thresholds)
+
+    # Number of rows per location and segment (segment 0: missing production, counts for the total days only)
+    in_locations = np.flatnonzero(location_codes >= 0)
+    keys = location_codes[in_locations] * 4 + segments[in_locations]
+    counts = np.bincount(keys, minlength=4 * len(locations)).reshape(len(locations), 4)
+
+    # Row positions grouped by location and segment, split at the group boundaries
+    positions = np.split(in_locations[np.argsort(keys, kind='stable')], np.cumsum(counts.ravel())[:-1])
+
+    results = {}
+    for i, location in enumerate(locations):
+        total_days_location = counts[i].sum()
+
+        # Calculate shares
+        share_1, share_2, share_3 = (round(float(counts[i, segment] / total_days_location), 4) if total_days_location
+                                     else np.nan for segment in (1, 2, 3))
+
+        segment_1, segment_2, segment_3 = (df.iloc[positions[4 * i + segment]] for segment in (1, 2, 3))
+        results[location] = (share_1, share_2, share_3, segment_1, segment_2, segment_3)
+
+    return results
+
 
 def create_segments(location, threshold_1, threshold_2, df):
     """
@@ -12,35 +97,135 @@ def create_segments(location, threshold_1, threshold_2, df):
         df (DataFrame): The DataFrame with the data
 
     Returns:
-        tuple: A tuple with 3 dataframe segments.
+        tuple: A tuple with the 3 shares and 3 dataframe segments.
+
+    Segment 1: production < threshold_1, segment 2: threshold_1 <= production < threshold_2,
+    segment 3: production >= threshold_2 (all for the given location).
+    To segment several locations, use create_all_segments, which needs only one pass over the data.
+    """
+    return create_all_segments(df, {location: (threshold_1, threshold_2)})[location]
+
+
+def sweep_threshold_2(production, threshold_1, candidates=None, grid_points=512, max_chunk_bytes=MAX_SWEEP_BYTES):
+    """
+    Calculate the segment values and the goodness of fit for many candidate values of threshold_2 at once.
+
+    Parameters:
+        production (array-like): The production values of one location.
+        threshold_1 (float): The first production threshold.
+        candidates (array-like or None): Candidate values for threshold_2. Default is every distinct production
+                                         value >= threshold_1 (each possible split between segments 2 and 3).
+        grid_points (int): Number of production values (empirical quantiles) at which the fitted and the
+                           empirical CDF are compared. Default is 512.
+        max_chunk_bytes (int): Memory budget for the goodness of fit of one chunk of candidates (in bytes).
+
+    Returns:
+        DataFrame: Per candidate threshold_2 the shares, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3
+                   (as calculate_and_save_segments_values would fit them) and 'ks', the largest distance
+                   between the fitted mixture CDF and the empirical CDF at the grid values.
+                   Candidates that leave fewer than 2 values in segment 2 or segment 3 are left out, candidates
+                   with a constant segment 2 or segment 3 get ks inf.
+
+    The production is sorted once. With searchsorted the segment sizes follow for all candidates, the uniform
+    bounds are the first and last value of segment 2, and the normal fit (mean and standard deviation, like
+    norm.fit) follows from prefix sums of the values and their squares. In total this is O(n log n) plus
+    O(candidates * grid_points) for the goodness of fit (in chunks of candidates), instead of a full refit per
+    candidate.
     """
-    # Segment 1: No maintenance and production < threshold_1 for the given location
-    segment_1 = df[
-        (df['location'] == location) &
-        (df['production'] < threshold_1)
-        ]
 
-    # Segment 2: No maintenance, threshold 1 <= productie < threshold_2 for the given location
-    segment_2 = df[
-        (df['location'] == location) &
-        (df['production'] >= threshold_1) &
-        (df['production'] < threshold_2)
-        ]
+    from scipy.special import ndtr
+
+    values = np.sort(np.asarray(production, dtype=float))
+    values = values[~np.isnan(values)]
+    n = len(values)
 
-    # Segment 3: No maintenance and production >= threshold_2 for the given location
-    segment_3 = df[
-        (df['location'] == location) &
-        (df['production'] >= threshold_2)
-        ]
+    start_2 = np.searchsorted(values, threshold_1, side='left')
+    if candidates is None:
+        candidates = np.unique(values[start_2:])
+    candidates = np.asarray(candidates, dtype=float)
+    start_3 = np.searchsorted(values, candidates, side='left')
 
-    total_days_location = len(df[df['location'] == location])
+    # Keep candidates with at least 2 values in segment 2 and in segment 3
+    valid = (start_3 - start_2 >= 2) & (n - start_3 >= 2)
+    candidates, start_3 = candidates[valid], start_3[valid]
+    count_3 = n - start_3
 
-    # Calculate shares
-    share_1 = round(len(segment_1) / total_days_location, 4)
-    share_2 = round(len(segment_2) / total_days_location, 4)
-    share_3 = round(len(segment_3) / total_days_location, 4)
+    # Prefix sums of the (centered) values and squares for the normal fit of segment 3
+    center = values.mean() if n else 0.0
+    prefix_sum = np.concatenate([[0.0], np.cumsum(values - center)])
+    prefix_squares = np.concatenate([[0.0], np.cumsum((values - center) ** 2)])
+    mean_3 = (prefix_sum[n] - prefix_sum[start_3]) / count_3
+    param1_s3 = center + mean_3
+    param2_s3 = np.sqrt(np.maximum((prefix_squares[n] - prefix_squares[start_3]) / count_3 - mean_3 ** 2, 0.0))
 
-    return share_1, share_2, share_3, segment_1, segment_2, segment_3
+    share_1 = start_2 / n
+    share_2 = (start_3 - start_2) / n
+    share_3 = count_3 / n
+    lower_bound_s2 = values[start_2] if start_2 < n else np.nan
+    upper_bound_s2 = values[start_3 - 1]
+
+    # Goodness of fit: compare the mixture CDF with the empirical CDF at a grid of empirical quantiles.
+    # Candidates with a (nearly) constant segment 2 or 3 have no uniform or normal fit: their ks is inf.
+    grid = np.unique(np.quantile(values, np.linspace(0, 1, grid_points))) if n else np.empty(0)
+    empirical_cdf = np.searchsorted(values, grid, side='right') / n
+    width_2 = upper_bound_s2 - lower_bound_s2
+    tolerance = np.sqrt(np.finfo(float).eps) * (np.abs(values).max() if n else 1.0)
+    fitted = (width_2 > tolerance) & (param2_s3 > tolerance)
+    ks = np.full(len(candidates), np.inf if len(grid) else np.nan)
+    indices = np.flatnonzero(fitted) if len(grid) else np.empty(0, dtype=np.int64)
+    size = max(1, max_chunk_bytes // (32 * max(len(grid), 1)))  # about 4 float arrays of size x len(grid)
+    for start in range(0, len(indices), size):
+        chunk = indices[start:start + size]
+        fitted_cdf = (share_1 * (grid >= 0)
+                      + share_2[chunk, None] * np.clip((grid - lower_bound_s2) / width_2[chunk, None], 0.0, 1.0)
+                      + share_3[chunk, None] * ndtr((grid - param1_s3[chunk, None]) / param2_s3[chunk, None]))
+        ks[chunk] = np.abs(fitted_cdf - empirical_cdf).max(axis=1)
+
+    return pd.DataFrame({
+        'threshold_2': candidates,
+        'share_1': share_1,
+        'share_2': share_2,
+        'share_3': share_3,
+        'lower_bound_s2': lower_bound_s2,
+        'upper_bound_s2': upper_bound_s2,
+        'param1_s3': param1_s3,
+        'param2_s3': param2_s3,
+        'ks': ks
+    })
+
+
+@instrument('segment', count=len)
+def select_thresholds_2(df, threshold_1, locations=None, candidates=None):
+    """
+    Select threshold_2 per location automatically: the candidate with the best goodness of fit.
+
+    Parameters:
+        df (DataFrame): The DataFrame with the data (columns 'location' and 'production').
+        threshold_1 (float): The first production threshold.
+        locations (list or None): The locations to select a threshold for. Default is all locations in df.
+        candidates (array-like or None): Candidate values for threshold_2 (see sweep_threshold_2).
+
+    Returns:
+        dict: The selected threshold_2 per location, e.g. {'BRU': 750.0, 'STO': 150.0}.
+              It can replace the visually determined location_threshold_2 in the notebook.
+
+    Raises:
+        ValueError: If a location has no candidate with a fit (too few or constant values); pass its
+                    threshold_2 explicitly instead.
+    """
+    if locations is None:
+        locations = list(pd.unique(df['location']))
+
+    selected = {}
+    for location, production in df.groupby('location', observed=True)['production']:
+        if location in locations:
+            sweep = sweep_threshold_2(production, threshold_1, candidates)
+            if not np.isfinite(sweep['ks']).any():
+                raise ValueError(f"No threshold_2 candidate of location '{location}' gives a uniform and a normal "
+                                 f"fit; pass its threshold_2 explicitly.")
+            selected[location] = float(sweep['threshold_2'].iloc[sweep['ks'].idxmin()])
+
+    return {location: selected[location] for location in locations if location in selected}
 
 
 def print_segment_share(location, threshold_1, threshold_2, share_1, share_2, share_3):
@@ -63,8 +248,9 @@ def print_segment_share(location, threshold_1, threshold_2, share_1, share_2, sh
     print(f"{location}: % days with [production >= {threshold_2}]:", round(100 * share_3,2), '%')
 
 
+@instrument('fit')
 def calculate_and_save_segments_values(location, threshold_1, threshold_2, share_1, segment_2, segment_3,
-                                       share_2, share_3, filename):
+                                       share_2, share_3, filename, parameter_store=None):
     """
     Calculate segment values for Segment 2 and Segment 3 and save them to a JSON file.
 
@@ -75,17 +261,21 @@ def calculate_and_save_segments_values(location, threshold_1, threshold_2, share
         segment_2 (DataFrame): Data for Segment 2.
         segment_3 (DataFrame): Data for Segment 3.
         filename (str): The filename to save the results to.
+        parameter_store (str or None): The parameter store file (see parameter_store.py) to save the results to
+                                       as well. Default is None (only save to filename).
 
     Returns:
         results (dict): Dictionary containing calculated parameters for each segment and distribution.
     """
 
-    # Calculate segment values
+    # Calculate segment values (as Python floats, so they can be saved to JSON for any column data type)
     results = {}
-    lower_bound_s2 = segment_2['production'].min()
-    upper_bound_s2 = segment_2['production'].max()
+    lower_bound_s2 = float(segment_2['production'].min())
+    upper_bound_s2 = float(segment_2['production'].max())
 
-    param1_s3, param2_s3 = norm.fit(segment_3['production'])
+    from scipy.stats import norm
+
+    param1_s3, param2_s3 = (float(value) for value in norm.fit(segment_3['production'].astype(float)))
 
     results[location] = {
         'threshold_1': threshold_1,
@@ -103,4 +293,132 @@ def calculate_and_save_segments_values(location, threshold_1, threshold_2, share
     with open(filename, 'w') as json_file:
         json.dump(results, json_file)
 
+    if parameter_store is not None:
+        save_parameters(results, parameter_store)
+
+    return results
+
+
+def create_segment_statistics(location, threshold_1, threshold_2):
+    """
+    Create an empty statistics state for a location, to fit the segment values incrementally.
+
+    Parameters:
+        location (str): The location name.
+        threshold_1 (float): Threshold value 1.
+        threshold_2 (float): Threshold value 2.
+
+    Returns:
+        dict: The state: the thresholds, the number of days with missing production and in segment 1,
+              and the running count, mean, sum of squared deviations (Welford), minimum and maximum
+              of segments 2 and 3.
+    """
+
+    return {location: {
+        'threshold_1': threshold_1,
+        'threshold_2': threshold_2,
+        'count_missing': 0,
+        'count_1': 0,
+        'segment_2': RunningMoments().to_dict(),
+        'segment_3': RunningMoments().to_dict()
+    }}
+
+
+@instrument('fit')
+def update_segment_statistics(statistics, location, production):
+    """
+    Fold new production values of a location into its statistics state, in O(number of new values).
+
+    Parameters:
+        statistics (dict): The state made by create_segment_statistics (or loaded from JSON).
+        location (str): The location name.
+        production (array-like): The new production values (e.g. the newest days without maintenance).
+
+    Returns:
+        dict: The updated state (statistics is updated in place).
+    """
+
+    state = statistics[location]
+    values = np.asarray(production, dtype=float)
+
+    missing = np.isnan(values)
+    in_segment_1 = values < state['threshold_1']
+    in_segment_3 = values >= state['threshold_2']
+    in_segment_2 = ~(missing | in_segment_1 | in_segment_3)
+
+    state['count_missing'] += int(np.count_nonzero(missing))
+    state['count_1'] += int(np.count_nonzero(in_segment_1))
+    for key, in_segment in (('segment_2', in_segment_2), ('segment_3', in_segment_3)):
+        moments = RunningMoments.from_dict(state[key])
+        moments.update(values[in_segment])
+        state[key] = moments.to_dict()
+
+    return statistics
+
+
+def calculate_segments_values_from_statistics(statistics, location):
+    """
+    Calculate the segment values of a location from its statistics state.
+
+    Parameters:
+        statistics (dict): The state made by create_segment_statistics and update_segment_statistics.
+        location (str): The location name.
+
+    Returns:
+        results (dict): The same dictionary as calculate_and_save_segments_values returns for the same data.
+                        The values of a segment without days are None, and so are the shares without any days.
+    """
+
+    state = statistics[location]
+    segment_2 = RunningMoments.from_dict(state['segment_2'])
+    segment_3 = RunningMoments.from_dict(state['segment_3'])
+    total_days_location = state['count_missing'] + state['count_1'] + segment_2.count + segment_3.count
+
+    def share(count):
+        return round(count / total_days_location, 4) if total_days_location else None
+
+    return {location: {
+        'threshold_1': state['threshold_1'],
+        'threshold_2': state['threshold_2'],
+        'share_1': share(state['count_1']),
+        'share_2': share(segment_2.count),
+        'share_3': share(segment_3.count),
+        'lower_bound_s2': segment_2.minimum if segment_2.count else None,
+        'upper_bound_s2': segment_2.maximum if segment_2.count else None,
+        'param1_s3': segment_3.mean if segment_3.count else None,
+        'param2_s3': float(segment_3.std) if segment_3.count else None
+    }}
+
+
+@instrument('fit')
+def refresh_segments_values(location, production, statistics_filename, filename):
+    """
+    Fold new production values into the saved statistics of a location and save the updated segment values.
+
+    Parameters:
+        location (str): The location name.
+        production (array-like): The new production values since the last refresh.
+        statistics_filename (str): The JSON file with the statistics state (see create_segment_statistics).
+        filename (str): The JSON file to save the segment values to (as calculate_and_save_segments_values).
+
+    Returns:
+        results (dict): Dictionary containing calculated parameters for each segment and distribution.
+
+    Only the new values are processed, so the model parameters can be refreshed every day without
+    reloading the full history.
+    """
+
+    with open(statistics_filename, 'r') as json_file:
+        statistics = json.load(json_file)
+
+    update_segment_statistics(statistics, location, production)
+    results = calculate_segments_values_from_statistics(statistics, location)
+
+    # Save the state and the results to JSON files (standard JSON: empty statistics are None, not NaN or Infinity),
+    # each replaced atomically so a crash never leaves a truncated file
+    with atomic_file(statistics_filename) as json_file:
+        json.dump(statistics, json_file, allow_nan=False)
+    with atomic_file(filename) as json_file:
+        json.dump(results, json_file, allow_nan=False)
+
     return results
@@ -1,8 +1,173 @@
-import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
+from instrumentation import instrument
+from samplers import UniformSampler, daily_production
+from summaries import BINS, SimulationSummary
+
+# Default number of simulated trials
+NUM_VALUES = 10**5
+
+# Upper bound for the memory used by the random draws of a single chunk of trials (in bytes)
+MAX_CHUNK_BYTES = 2**25
+
+# Maximum number of trials per block of the parallel simulation (each block has its own random stream)
+BLOCK_SIZE = 2**16
+
+# Keys of the segment parameters (as saved by calculate_and_save_segments_values) used by the simulation
+PARAMETER_KEYS = ['share_1', 'share_2', 'lower_bound_s2', 'upper_bound_s2', 'param1_s3', 'param2_s3']
+
+# Estimated value with its standard error
+Estimate = namedtuple('Estimate', ['value', 'stderr'])
+
+
+def trial_count(result):
+    """
+    Number of simulated trials in a result of simulate_summary, simulate_horizons, simulate_parallel or
+    simulate_locations (used by the instrumentation).
+    """
+
+    if isinstance(result, SimulationSummary):
+        return result.count
+    if isinstance(result, dict):
+        return sum(len(values) for values in result.values())
+    if isinstance(result, tuple):
+        return len(result[1])
+
+    return len(result)
+
+
+def segment_parameters(params):
+    """
+    Extract the simulation parameters from the segment values of a location.
+
+    Parameters:
+        params (dict): Segment values of one location, e.g. data[location] of a saved JSON file.
+
+    Returns:
+        tuple: share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3
+    """
+
+    return tuple(params[key] for key in PARAMETER_KEYS)
+
+
+def production_range(share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3, n_days,
+                     n_std=8):
+    """
+    Calculate a range that holds practically all outcomes of the total production over a number of days.
+
+    Parameters:
+        share_1 (float): Share of production for segment 1.
+        share_2 (float): Share of production for segment 2.
+        lower_bound_s2 (float): Lower bound threshold for segment 2.
+        upper_bound_s2 (float): Upper bound threshold for segment 2.
+        param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
+        param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
+        n_days (int): Number of days.
+        n_std (float): Number of standard deviations on each side of the mean. Default is 8.
+
+    Returns:
+        tuple: The lower and upper value of the range.
+
+    The mean and variance of the daily production follow from the mixture, those of the total
+    over n_days are n_days times larger.
+    """
+
+    share_3 = max(0.0, 1.0 - share_1 - share_2)
+    daily_mean = share_2 * (lower_bound_s2 + upper_bound_s2) / 2 + share_3 * param1_s3
+    daily_square = (share_2 * (lower_bound_s2 ** 2 + lower_bound_s2 * upper_bound_s2 + upper_bound_s2 ** 2) / 3
+                    + share_3 * (param1_s3 ** 2 + param2_s3 ** 2))
+    std = np.sqrt(n_days * max(daily_square - daily_mean ** 2, 0.0))
+
+    # Always keep a non-empty range, also when there is no spread at all
+    spread = max(n_std * std, 1.0)
+
+    return n_days * daily_mean - spread, n_days * daily_mean + spread
+
+
+def chunk_size(share_2, n_days, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Calculate the number of trials that fit in one chunk within the memory budget.
+
+    Parameters:
+        share_2 (float): Share of production for segment 2.
+        n_days (int): Number of days for which to simulate the production process.
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk (in bytes).
+
+    Returns:
+        int: The number of trials per chunk.
+
+    Per trial we keep three segment counts, one normal draw and on average `share_2 * n_days` uniform draws.
+    """
+
+    bytes_per_trial = 8 * (4 + int(np.ceil(share_2 * n_days)))
+
+    return max(1, max_chunk_bytes // bytes_per_trial)
+
+
+def sampler_chunk_size(n_days, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Calculate the number of trials per chunk for the samplers that draw one uniform number per day.
+
+    Parameters:
+        n_days (int): Number of days for which to simulate the production process.
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk (in bytes).
+
+    Returns:
+        int: The number of trials per chunk, a power of 2 (even for antithetic pairs, balanced for Sobol).
+    """
+
+    rows = max(2, max_chunk_bytes // (16 * n_days))
+
+    return 1 << (rows.bit_length() - 1)
+
+
+def simulate_chunk(rng, share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3,
+                   n_days, size):
+    """
+    Simulate the total production over a number of days for one chunk of trials.
+
+    Parameters:
+        rng (numpy.random.Generator): The random generator to draw from.
+        share_1 (float): Share of production for segment 1.
+        share_2 (float): Share of production for segment 2.
+        lower_bound_s2 (float): Lower bound threshold for segment 2.
+        upper_bound_s2 (float): Upper bound threshold for segment 2.
+        param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
+        param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
+        n_days (int): Number of days for which to simulate the production process.
+        size (int): Number of trials in the chunk.
+
+    Returns:
+        numpy.ndarray: The simulated total production of each trial.
+
+    Instead of drawing a segment and a value for every single day, the number of days per segment is drawn
+    for all trials at once with a multinomial distribution. Segment 1 days produce nothing, the sum of the
+    segment 3 days is drawn directly (a sum of k normal values is normal with mean k * mean and standard
+    deviation sqrt(k) * std), and only the segment 2 days need one uniform draw each.
+    """
+
+    # Number of days in each segment for every trial
+    share_3 = max(0.0, 1.0 - share_1 - share_2)
+    counts = rng.multinomial(n_days, [share_1, share_2, share_3], size=size)
+    days_s2 = counts[:, 1]
+    days_s3 = counts[:, 2]
+
+    # Segment 3: sum of days_s3 normal values
+    totals = param1_s3 * days_s3 + param2_s3 * np.sqrt(days_s3) * rng.standard_normal(size)
+
+    # Segment 2: draw all uniform values of the chunk at once and add them to their trial
+    uniform_values = rng.uniform(lower_bound_s2, upper_bound_s2, days_s2.sum())
+    totals += np.bincount(np.repeat(np.arange(size), days_s2), weights=uniform_values, minlength=size)
+
+    return totals
+
+
+@instrument('simulate', count=len)
 def simulate(share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3,
-             n_days):
+             n_days, num_values=NUM_VALUES, rng=None, sampler='pseudo', max_chunk_bytes=MAX_CHUNK_BYTES):
 
     """
     Simulate production processes for three production segments over a specified number of days.
@@ -15,30 +180,415 @@ def simulate(share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2
         param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
         param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
         n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        rng (numpy.random.Generator, int or None): Random generator or seed. Default is a fresh generator.
+        sampler (str): Sampling method, one of samplers.SAMPLERS. Default is 'pseudo'.
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk of trials (in bytes).
 
     Returns:
-        list: A list of simulated production values for each simulated day.
+        numpy.ndarray: An array with the simulated total production of each trial.
 
     This function simulates the production process for three production segments over a specified number of days.
     Each segment is defined by its share of production and threshold values.
-    For each simulated day, random values are generated according to the defined segments,
-    and the total production for that day is calculated and appended to a list.
-    The function returns a list containing the simulated production values for each simulated day.
-
-    Note:
-        This function utilizes vectorized operations for efficient random number generation.
+    The trials are processed in chunks (see `simulate_chunk`), so the memory use stays flat
+    regardless of the number of trials and days.
+    The variance-reducing samplers ('antithetic', 'stratified', 'sobol') draw one uniform number per day
+    and transform it with `samplers.daily_production`.
     """
 
-    num_values = 10**5
-    random_numbers = np.random.random((num_values, n_days))
-    all_random_sums = []
+    rng = np.random.default_rng(rng)
+    all_random_sums = np.empty(num_values)
 
-    for i in range(num_values):
-        random_values = random_numbers[i]
-        random_sum = np.sum(np.where(random_values < share_1, 0,
-                                     np.where(random_values < (share_1 + share_2),
-                                              np.random.uniform(lower_bound_s2, upper_bound_s2, n_days),
-                                              np.random.normal(param1_s3, param2_s3, n_days))))
-        all_random_sums.append(random_sum)
+    if sampler == 'pseudo':
+        size = chunk_size(share_2, n_days, max_chunk_bytes)
+        for start in range(0, num_values, size):
+            stop = min(start + size, num_values)
+            all_random_sums[start:stop] = simulate_chunk(rng, share_1, share_2, lower_bound_s2, upper_bound_s2,
+                                                         param1_s3, param2_s3, n_days, stop - start)
+        return all_random_sums
+
+    uniform_sampler = UniformSampler(sampler, n_days, rng)
+    size = sampler_chunk_size(n_days, max_chunk_bytes)
+    for start in range(0, num_values, size):
+        stop = min(start + size, num_values)
+        uniform_values = uniform_sampler.random(stop - start)
+        all_random_sums[start:stop] = daily_production(uniform_values, share_1, share_2, lower_bound_s2,
+                                                       upper_bound_s2, param1_s3, param2_s3).sum(axis=1)
 
     return all_random_sums
+
+
+@instrument('simulate', count=trial_count)
+def simulate_summary(share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3,
+                     n_days, num_values=NUM_VALUES, rng=None, bins=BINS, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Simulate production processes like `simulate`, but stream every chunk into a summary instead of an array.
+
+    Parameters:
+        share_1 (float): Share of production for segment 1.
+        share_2 (float): Share of production for segment 2.
+        lower_bound_s2 (float): Lower bound threshold for segment 2.
+        upper_bound_s2 (float): Upper bound threshold for segment 2.
+        param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
+        param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
+        n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        rng (numpy.random.Generator, int or None): Random generator or seed. Default is a fresh generator.
+        bins (int): Number of bins of the histogram over `production_range`. Default is BINS.
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk of trials (in bytes).
+
+    Returns:
+        SimulationSummary: Mean, standard deviation, histogram, quantiles and CDF of the simulated totals.
+
+    The memory use does not depend on num_values, so 10**8 trials run in constant memory.
+    """
+
+    parameters = (share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3)
+    rng = np.random.default_rng(rng)
+    size = chunk_size(share_2, n_days, max_chunk_bytes)
+    summary = SimulationSummary(*production_range(*parameters, n_days), bins)
+
+    for start in range(0, num_values, size):
+        summary.update(simulate_chunk(rng, *parameters, n_days, min(size, num_values - start)))
+
+    return summary
+
+
+@instrument('simulate')
+def simulate_estimates(params, n_days, num_values=2**14, sampler='sobol', quantiles=(0.05, 0.5, 0.95),
+                       replicates=16, rng=None, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Estimate the mean and quantiles of the total production over a number of days, with standard errors.
+
+    Parameters:
+        params (dict): Segment values of one location, e.g. data[location] of a saved JSON file.
+        n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Total number of simulated trials over all replicates. Default is 2**14.
+        sampler (str): Sampling method, one of samplers.SAMPLERS. Default is 'sobol'.
+        quantiles (iterable of float): Probabilities of the quantiles to estimate. Default is 5%, 50% and 95%.
+        replicates (int): Number of independent replicates. Default is 16.
+        rng (numpy.random.Generator, int or None): Random generator or seed. Default is a fresh generator.
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk of trials (in bytes).
+
+    Returns:
+        dict: An Estimate (value, stderr) for 'mean' and for every probability in quantiles.
+
+    The trials are split over independent replicates (independent random streams, or independent
+    scramblings of the Sobol sequence). Every statistic is calculated per replicate; the estimate is the
+    average over the replicates and its standard error is their standard deviation / sqrt(replicates).
+    This works the same way for every sampler, also for the ones whose trials are not independent.
+    """
+
+    rng = np.random.default_rng(rng)
+    size = num_values // replicates
+    quantiles = list(quantiles)
+    statistics = np.empty((replicates, 1 + len(quantiles)))
+
+    for replicate in range(replicates):
+        totals = simulate(*segment_parameters(params), n_days, num_values=size, rng=rng, sampler=sampler,
+                          max_chunk_bytes=max_chunk_bytes)
+        statistics[replicate, 0] = totals.mean()
+        statistics[replicate, 1:] = np.quantile(totals, quantiles)
+
+    values = statistics.mean(axis=0)
+    stderrs = statistics.std(axis=0, ddof=1) / np.sqrt(replicates)
+    keys = ['mean'] + quantiles
+
+    return {key: Estimate(float(value), float(stderr)) for key, value, stderr in zip(keys, values, stderrs)}
+
+
+@instrument('simulate', count=trial_count)
+def simulate_horizons(params, horizons=(1, 7, 91, 365), num_values=NUM_VALUES, rng=None,
+                      max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Simulate the total production over several horizons in a single pass.
+
+    Parameters:
+        params (dict): Segment values of one location, e.g. data[location] of a saved JSON file.
+        horizons (iterable of int): Numbers of days to simulate. Default is 1 day, 1 week, 3 months and 1 year.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        rng (numpy.random.Generator, int or None): Random generator or seed. Default is a fresh generator.
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk of trials (in bytes).
+
+    Returns:
+        dict: The simulated total production of each trial (numpy.ndarray) per horizon.
+
+    Only the longest horizon is simulated. Each trial is built up in consecutive blocks of days
+    (e.g. day 1, days 2-7, days 8-91 and days 92-365), and every shorter horizon is read from the
+    running total of the same trial. The horizons are therefore consistent with each other:
+    the 7-day total of a trial contains its 1-day total.
+    """
+
+    share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3 = segment_parameters(params)
+    horizons = sorted(set(int(n_days) for n_days in horizons))
+
+    rng = np.random.default_rng(rng)
+    size = chunk_size(share_2, horizons[-1], max_chunk_bytes)
+    results = {n_days: np.empty(num_values) for n_days in horizons}
+
+    for start in range(0, num_values, size):
+        stop = min(start + size, num_values)
+        running_total = np.zeros(stop - start)
+        previous_days = 0
+
+        for n_days in horizons:
+            running_total += simulate_chunk(rng, share_1, share_2, lower_bound_s2, upper_bound_s2,
+                                            param1_s3, param2_s3, n_days - previous_days, stop - start)
+            results[n_days][start:stop] = running_total
+            previous_days = n_days
+
+    return results
+
+
+def simulate_block(task):
+    """
+    Simulate one block of trials with its own random stream (used by simulate_parallel).
+
+    Parameters:
+        task (tuple): The seed sequence of the block, the tuple of segment parameters
+                      (see segment_parameters), the number of days, the number of trials and
+                      the number of histogram bins (None to return the values).
+
+    Returns:
+        numpy.ndarray or SimulationSummary: The simulated total production of each trial in the block,
+                                            or their summary.
+    """
+
+    seed_sequence, parameters, n_days, size, bins = task
+    values = simulate_chunk(np.random.default_rng(seed_sequence), *parameters, n_days, size)
+
+    if bins is None:
+        return values
+
+    summary = SimulationSummary(*production_range(*parameters, n_days), bins)
+    summary.update(values)
+
+    return summary
+
+
+@instrument('simulate', count=trial_count)
+def simulate_parallel(share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3,
+                      n_days, num_values=NUM_VALUES, seed=None, workers=None, summarize=False, bins=BINS,
+                      max_chunk_bytes=MAX_CHUNK_BYTES, executor=None):
+    """
+    Simulate production processes like `simulate`, with the trials spread over a pool of processes.
+
+    Parameters:
+        share_1 (float): Share of production for segment 1.
+        share_2 (float): Share of production for segment 2.
+        lower_bound_s2 (float): Lower bound threshold for segment 2.
+        upper_bound_s2 (float): Upper bound threshold for segment 2.
+        param1_s3 (float): Parameter 1 for segment 3 (mean for normal distribution).
+        param2_s3 (float): Parameter 2 for segment 3 (standard deviation for normal distribution).
+        n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        seed (int, numpy.random.SeedSequence or None): Seed of the simulation. Default is fresh entropy.
+        workers (int or None): Number of worker processes. Default is the number of processors,
+                               1 runs everything in the current process.
+        summarize (bool): Whether to return a SimulationSummary instead of all values. Default is False.
+        bins (int): Number of histogram bins of the summary. Default is BINS.
+        max_chunk_bytes (int): Memory budget for the random draws of one block of trials (in bytes).
+        executor (concurrent.futures.Executor or None): Pool to run the blocks on, e.g. one ProcessPoolExecutor
+                                                        for many calls. Default is None (a new pool of workers).
+
+    Returns:
+        numpy.ndarray or SimulationSummary: An array with the simulated total production of each trial,
+                                            or the merged summary of all blocks.
+
+    The trials are split into fixed blocks of at most BLOCK_SIZE trials, and every block gets its own
+    child stream spawned from the seed with `numpy.random.SeedSequence.spawn`. The blocks only depend on
+    the seed and the parameters, not on the number of workers, so for a given seed the result is
+    bit-identical whether it runs on 1 or 64 processes. With summarize=True every block is summarized
+    in its worker and the summaries are merged in block order, so only the summaries leave the workers.
+    """
+
+    parameters = (share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3)
+    size = min(BLOCK_SIZE, chunk_size(share_2, n_days, max_chunk_bytes))
+    starts = range(0, num_values, size)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    tasks = [(seed_sequence, parameters, n_days, min(size, num_values - start), bins if summarize else None)
+             for seed_sequence, start in zip(seed.spawn(len(starts)), starts)]
+
+    if executor is not None:
+        blocks = list(executor.map(simulate_block, tasks))
+    elif workers == 1:
+        blocks = [simulate_block(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            blocks = list(executor.map(simulate_block, tasks))
+
+    if summarize:
+        summary = SimulationSummary(*production_range(*parameters, n_days), bins)
+        for block in blocks:
+            summary.merge(block)
+        return summary
+
+    return np.concatenate(blocks) if blocks else np.empty(0)
+
+
+def parameter_table(parameters):
+    """
+    Build a parameter table with one row per location.
+
+    Parameters:
+        parameters (dict or DataFrame): Segment values per location (e.g. the content of the parameter store),
+                                        or a DataFrame with the location as index and PARAMETER_KEYS as columns.
+
+    Returns:
+        DataFrame: The segment parameters (PARAMETER_KEYS) as float columns, one row per location.
+    """
+
+    # Imported here and in simulate_locations only: the simulation workers do not need pandas
+    import pandas as pd
+
+    if not isinstance(parameters, pd.DataFrame):
+        parameters = pd.DataFrame.from_dict(parameters, orient='index')
+
+    return parameters[PARAMETER_KEYS].astype(float)
+
+
+def simulate_locations_chunk(rng, table, n_days, size):
+    """
+    Simulate the total production over a number of days of all locations for one chunk of independent trials.
+
+    Parameters:
+        rng (numpy.random.Generator): The random generator to draw from.
+        table (DataFrame): The parameter table (see parameter_table).
+        n_days (int): Number of days for which to simulate the production process.
+        size (int): Number of trials in the chunk.
+
+    Returns:
+        numpy.ndarray: Array of shape (size, number of locations) with the simulated totals.
+
+    The same method as simulate_chunk, broadcast over the locations: one multinomial draw with a row of
+    shares per location, one normal draw per trial and location for segment 3, and one uniform draw per
+    segment 2 day, scaled to the bounds of its location.
+    """
+
+    share_1, share_2, lower_bound_s2, upper_bound_s2, param1_s3, param2_s3 = table.to_numpy().T
+    n_locations = len(table)
+
+    shares = np.stack([share_1, share_2, np.maximum(0.0, 1.0 - share_1 - share_2)], axis=1)
+    counts = rng.multinomial(n_days, shares, size=(size, n_locations))
+    days_s2 = counts[:, :, 1]
+    days_s3 = counts[:, :, 2]
+
+    # Segment 3: sum of days_s3 normal values
+    totals = param1_s3 * days_s3 + param2_s3 * np.sqrt(days_s3) * rng.standard_normal((size, n_locations))
+
+    # Segment 2: one uniform value per day, added to its trial and location
+    cells = np.repeat(np.arange(size * n_locations), days_s2.ravel())
+    locations = cells % n_locations
+    uniform_values = lower_bound_s2[locations] + ((upper_bound_s2 - lower_bound_s2)[locations]
+                                                  * rng.random(len(cells)))
+    totals += np.bincount(cells, weights=uniform_values, minlength=size * n_locations).reshape(size, n_locations)
+
+    return totals
+
+
+def simulate_correlated_locations_chunk(rng, table, n_days, size, correlation):
+    """
+    Simulate the total production of all locations for one chunk of trials, correlated through a shared daily factor.
+
+    Parameters:
+        rng (numpy.random.Generator): The random generator to draw from.
+        table (DataFrame): The parameter table (see parameter_table).
+        n_days (int): Number of days for which to simulate the production process.
+        size (int): Number of trials in the chunk.
+        correlation (float): Correlation between the latent daily factors of two locations (0 to 1).
+
+    Returns:
+        numpy.ndarray: Array of shape (size, number of locations) with the simulated totals.
+
+    Every day has a common factor F for all locations. The latent value of a location is
+    sqrt(correlation) * F + sqrt(1 - correlation) * e, with e its own standard normal value. It is turned into
+    a uniform number and then into the production of that location with samplers.daily_production, so both
+    the segment choice (e.g. a shared bad day) and the value are correlated, while every location keeps its
+    own daily distribution.
+    """
+
+    if not 0.0 <= correlation <= 1.0:
+        raise ValueError(f'The correlation must be between 0 and 1, got {correlation}.')
+
+    from scipy.special import ndtr
+
+    common_factor = np.sqrt(correlation) * rng.standard_normal((size, n_days))
+    totals = np.empty((size, len(table)))
+
+    for i, parameters in enumerate(table.itertuples(index=False)):
+        latent = common_factor + np.sqrt(1.0 - correlation) * rng.standard_normal((size, n_days))
+        totals[:, i] = daily_production(ndtr(latent), *parameters).sum(axis=1)
+
+    return totals
+
+
+def locations_chunk_size(table, n_days, correlation=0.0, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Calculate the number of trials of simulate_locations that fit in one chunk within the memory budget.
+
+    Parameters:
+        table (DataFrame): The parameter table (see parameter_table).
+        n_days (int): Number of days for which to simulate the production process.
+        correlation (float): Correlation between locations (see simulate_locations).
+        max_chunk_bytes (int): Memory budget for one chunk (in bytes).
+
+    Returns:
+        int: The number of trials per chunk.
+
+    Independent locations keep per trial and location the segment counts, the normal draw and the total, and
+    per segment 2 day of any location its cell, location, uniform draw and value (with the repeat in between).
+    Correlated locations are simulated one location at a time, with the common factor, the latent values,
+    the uniform numbers and the daily production (with its temporaries) per trial and day.
+    """
+
+    n_locations = len(table)
+    if correlation:
+        bytes_per_trial = 8 * (n_locations + 6 * n_days)
+    else:
+        bytes_per_trial = 8 * (6 * n_locations + 5 * int(np.ceil(table['share_2'].sum() * n_days)))
+
+    return max(1, max_chunk_bytes // bytes_per_trial)
+
+
+@instrument('simulate', count=trial_count)
+def simulate_locations(parameters, n_days, num_values=NUM_VALUES, rng=None, correlation=0.0,
+                       max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Simulate the production of many locations together, with the fleet total.
+
+    Parameters:
+        parameters (dict or DataFrame): Segment values per location (see parameter_table).
+        n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        rng (numpy.random.Generator, int or None): Random generator or seed. Default is a fresh generator.
+        correlation (float): Correlation between locations through a shared daily factor. Default is 0
+                             (independent locations).
+        max_chunk_bytes (int): Memory budget for the random draws of one chunk of trials (in bytes).
+
+    Returns:
+        tuple: A DataFrame with the simulated total production of each trial (rows) per location (columns),
+               and a numpy.ndarray with the total production of all locations together per trial.
+
+    All locations are simulated in one call with arrays of parameters instead of a loop of simulate calls.
+    Trial i of every location belongs to the same simulated period, so the fleet total is the row sum.
+    """
+
+    import pandas as pd
+
+    table = parameter_table(parameters)
+    rng = np.random.default_rng(rng)
+    n_locations = len(table)
+
+    size = locations_chunk_size(table, n_days, correlation, max_chunk_bytes)
+
+    totals = np.empty((num_values, n_locations))
+    for start in range(0, num_values, size):
+        stop = min(start + size, num_values)
+        if correlation:
+            totals[start:stop] = simulate_correlated_locations_chunk(rng, table, n_days, stop - start, correlation)
+        else:
+            totals[start:stop] = simulate_locations_chunk(rng, table, n_days, stop - start)
+
+    return pd.DataFrame(totals, columns=table.index), totals.sum(axis=1)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from parameter_store import PARAMETERS_FILE, atomic_file, params as location_parameters
+from simulate import NUM_VALUES, PARAMETER_KEYS, segment_parameters, simulate
+
+# Default folder of the cached simulation results
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'simulations')
+
+# Default maximum size of the cache folder (in bytes)
+MAX_CACHE_BYTES = 2**30
+
+# Part of every cache key: increase it when the simulation itself changes, to invalidate all results
+CACHE_VERSION = 1
+
+
+def cache_key(params, n_days, num_values, seed, sampler):
+    """
+    Calculate the content hash that identifies a simulation result.
+
+    Parameters:
+        params (dict): Segment values of one location.
+        n_days (int): Number of days.
+        num_values (int): Number of simulated trials.
+        seed (int): Seed of the simulation.
+        sampler (str): Sampling method.
+
+    Returns:
+        str: The SHA-256 hash of the segment parameters and the simulation settings.
+
+    Only the values that change the result are hashed, so a location gets a new key (and the old
+    result is no longer used) as soon as its segment values change.
+    """
+
+    content = {
+        'version': CACHE_VERSION,
+        'params': [float(value) for value in segment_parameters(params)],
+        'keys': PARAMETER_KEYS,
+        'n_days': int(n_days),
+        'num_values': int(num_values),
+        'seed': int(seed),
+        'sampler': sampler
+    }
+
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Delete the least recently used results until the cache folder is not larger than max_bytes.
+
+    Parameters:
+        cache_dir (str): The cache folder.
+        max_bytes (int): Maximum size of the cache folder (in bytes).
+    """
+
+    entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith('.npy') and entry.is_file()]
+    entries = sorted(((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in entries))
+    total_bytes = sum(size for _, size, _ in entries)
+
+    for _, size, path in entries:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def cached_simulate(params, n_days, num_values=NUM_VALUES, seed=0, sampler='pseudo',
+                    cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Simulate like `simulate`, but reuse an earlier result with the same parameters and settings.
+
+    Parameters:
+        params (dict): Segment values of one location, e.g. data[location] of a saved JSON file.
+        n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        seed (int or None): Seed of the simulation. Default is 0. None simulates without the cache.
+        sampler (str): Sampling method, one of samplers.SAMPLERS. Default is 'pseudo'.
+        cache_dir (str): The cache folder. Default is CACHE_DIR.
+        max_bytes (int): Maximum size of the cache folder (in bytes). Default is MAX_CACHE_BYTES.
+
+    Returns:
+        numpy.ndarray: The simulated total production of each trial (read-only and memory-mapped
+                       when it comes from the cache).
+
+    The results are stored as <cache key>.npy files (see cache_key). Every hit marks the file as recently
+    used; after every new result the least recently used files are deleted until the folder fits in max_bytes.
+    """
+
+    if seed is None:
+        return simulate(*segment_parameters(params), n_days, num_values=num_values, sampler=sampler)
+
+    path = os.path.join(cache_dir, cache_key(params, n_days, num_values, seed, sampler) + '.npy')
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+            return np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            pass
+
+    simulated_data = simulate(*segment_parameters(params), n_days, num_values=num_values, rng=seed, sampler=sampler)
+
+    # Write to a temporary file first, so other processes never read a half-written result
+    with atomic_file(path, 'wb') as f:
+        np.save(f, simulated_data)
+    evict(cache_dir, max_bytes)
+
+    return simulated_data
+
+
+def cached_simulate_location(location, n_days, num_values=NUM_VALUES, seed=0, sampler='pseudo',
+                             parameter_store=PARAMETERS_FILE, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Simulate a location with its current segment values from the parameter store, using the cache.
+
+    Parameters:
+        location (str): The location name.
+        n_days (int): Number of days for which to simulate the production process.
+        num_values (int): Number of simulated trials. Default is 10**5.
+        seed (int or None): Seed of the simulation. Default is 0.
+        sampler (str): Sampling method. Default is 'pseudo'.
+        parameter_store (str): The parameter store file. Default is PARAMETERS_FILE.
+        cache_dir (str): The cache folder. Default is CACHE_DIR.
+        max_bytes (int): Maximum size of the cache folder (in bytes). Default is MAX_CACHE_BYTES.
+
+    Returns:
+        numpy.ndarray: The simulated total production of each trial.
+
+    When the segment values of the location change in the store, the cache key changes with them,
+    so an outdated result is never returned.
+    """
+
+    return cached_simulate(location_parameters(location, parameter_store), n_days, num_values, seed, sampler,
+                           cache_dir, max_bytes)
@@ -0,0 +1,338 @@
+import numpy as np
+
+# Default number of bins of the fixed-bin histogram
+BINS = 1000
+
+# Size parameter k of the quantile sketch (a larger k gives a smaller rank error)
+SKETCH_SIZE = 1000
+
+
+class RunningMoments:
+    """
+    Running count, mean, variance, minimum and maximum of a stream of values.
+
+    Chunks are combined with the parallel version of Welford's algorithm (Chan et al.),
+    so the result does not lose precision when many chunks are added or merged.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def combine(self, count, mean, m2, minimum, maximum):
+        """
+        Add the moments of a group of values (count, mean, sum of squared deviations, minimum, maximum).
+        """
+
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def update(self, values):
+        """
+        Add a chunk of values.
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self.combine(len(values), mean, np.sum((values - mean) ** 2), values.min(), values.max())
+
+    def merge(self, other):
+        """
+        Add the moments of another RunningMoments object.
+        """
+
+        self.combine(other.count, other.mean, other.m2, other.minimum, other.maximum)
+
+    def to_dict(self):
+        """
+        Return the state as a dictionary of Python numbers (e.g. to save it to JSON).
+        The minimum and maximum of no values are None, so the JSON file has no Infinity tokens.
+        """
+
+        empty = self.count == 0
+
+        return {'count': int(self.count), 'mean': float(self.mean), 'm2': float(self.m2),
+                'minimum': None if empty else float(self.minimum), 'maximum': None if empty else float(self.maximum)}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Create a RunningMoments object from a dictionary made by to_dict.
+        """
+
+        moments = cls()
+        moments.count = state['count']
+        moments.mean = state['mean']
+        moments.m2 = state['m2']
+        moments.minimum = np.inf if state['minimum'] is None else state['minimum']
+        moments.maximum = -np.inf if state['maximum'] is None else state['maximum']
+
+        return moments
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class StreamingHistogram:
+    """
+    Histogram with fixed, equal-width bins that is filled chunk by chunk.
+
+    Values outside [low, high) are counted in `underflow` and `overflow`.
+    """
+
+    def __init__(self, low, high, bins=BINS):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, values):
+        """
+        Add a chunk of values.
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        bins = len(self.counts)
+        low, high = self.edges[0], self.edges[-1]
+        indices = np.floor((values - low) * (bins / (high - low))).astype(np.int64)
+        self.underflow += int(np.count_nonzero(indices < 0))
+        self.overflow += int(np.count_nonzero(indices >= bins))
+        inside = indices[(indices >= 0) & (indices < bins)]
+        self.counts += np.bincount(inside, minlength=bins)
+
+    def merge(self, other):
+        """
+        Add the counts of another histogram with the same bins.
+        """
+
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different bins can not be merged.")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch (KLL) with a memory use that does not grow with the number of values.
+
+    The values are kept in levels of compactors; a value at level h stands for 2**h values.
+    When a level is full, it is sorted and every second value moves to the next level.
+    The compaction offset alternates per level (instead of a coin flip), so the sketch is deterministic
+    and merging the same parts in the same order always gives the same result.
+    """
+
+    def __init__(self, k=SKETCH_SIZE):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.offsets = [0]
+        self.count = 0
+
+    def capacity(self, level):
+        """
+        Number of values a level can hold before it is compacted (smaller for lower levels).
+        """
+
+        height = len(self.levels)
+
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (height - 1 - level))))
+
+    def compress(self):
+        """
+        Compact every level that holds more values than its capacity.
+        """
+
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                    self.offsets.append(0)
+
+                # Keep the last value at this level if the count is odd, promote every second value of the rest
+                items = np.sort(items)
+                paired = len(items) - len(items) % 2
+                promoted = items[self.offsets[level]:paired:2]
+                self.offsets[level] = 1 - self.offsets[level]
+
+                self.levels[level] = items[paired:]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """
+        Add a chunk of values.
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self.compress()
+
+    def merge(self, other):
+        """
+        Add the values of another sketch.
+        """
+
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+                self.offsets.append(0)
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.compress()
+
+    def weighted_values(self):
+        """
+        Return the sorted values of the sketch and their cumulative weights.
+        """
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """
+        Estimate the value(s) below which a share q of the values lies.
+        """
+
+        values, cumulative_weights = self.weighted_values()
+        indices = np.searchsorted(cumulative_weights, np.asarray(q) * cumulative_weights[-1], side='left')
+
+        return values[np.minimum(indices, len(values) - 1)]
+
+    def cdf(self, x):
+        """
+        Estimate the share of values <= x.
+        """
+
+        values, cumulative_weights = self.weighted_values()
+        indices = np.searchsorted(values, x, side='right')
+
+        return np.where(indices > 0, cumulative_weights[np.maximum(indices - 1, 0)], 0.0) / cumulative_weights[-1]
+
+
+class SimulationSummary:
+    """
+    Summary of simulated values that is fed chunk by chunk, so the values never need to be kept in memory.
+
+    It combines running moments, a fixed-bin histogram and a quantile sketch. Summaries of parts of a
+    simulation (e.g. from parallel workers) can be combined with `merge`.
+
+    Attributes:
+        count (int): Number of values.
+        mean (float): Mean of the values.
+        std (float): Standard deviation of the values.
+        minimum (float): Smallest value.
+        maximum (float): Largest value.
+    """
+
+    def __init__(self, low, high, bins=BINS, sketch_size=SKETCH_SIZE):
+        self.moments = RunningMoments()
+        self.histogram_counts = StreamingHistogram(low, high, bins)
+        self.sketch = QuantileSketch(sketch_size)
+
+    def update(self, values):
+        """
+        Add a chunk of values.
+        """
+
+        self.moments.update(values)
+        self.histogram_counts.update(values)
+        self.sketch.update(values)
+
+    def merge(self, other):
+        """
+        Add the values summarized by another SimulationSummary with the same bins.
+        """
+
+        self.moments.merge(other.moments)
+        self.histogram_counts.merge(other.histogram_counts)
+        self.sketch.merge(other.sketch)
+
+        return self
+
+    @property
+    def count(self):
+        return self.moments.count
+
+    @property
+    def mean(self):
+        return self.moments.mean
+
+    @property
+    def std(self):
+        return self.moments.std
+
+    @property
+    def minimum(self):
+        return self.moments.minimum
+
+    @property
+    def maximum(self):
+        return self.moments.maximum
+
+    def quantile(self, q):
+        """
+        Estimate the value(s) below which a share q of the values lies (e.g. q=0.05 for the 5% percentile).
+
+        The histogram gives the exact bin of the quantile; within (or outside) the bins the sketch fills in the value.
+        """
+
+        q = np.asarray(q, dtype=float)
+        histogram = self.histogram_counts
+        cumulative_counts = histogram.underflow + np.concatenate([[0], np.cumsum(histogram.counts)])
+        ranks = q * self.count
+
+        inside = (ranks > cumulative_counts[0]) & (ranks <= cumulative_counts[-1])
+        indices = np.clip(np.searchsorted(cumulative_counts, ranks, side='left'), 1, len(histogram.counts))
+        bounded = np.clip(self.sketch.quantile(q), histogram.edges[indices - 1], histogram.edges[indices])
+
+        return np.where(inside, bounded, self.sketch.quantile(q))
+
+    def cdf(self, x):
+        """
+        Estimate the cumulative probability P(value <= x).
+
+        The histogram gives the exact probability up to the bin of x; within (or outside) the bins the sketch fills in.
+        """
+
+        x = np.asarray(x, dtype=float)
+        histogram = self.histogram_counts
+        edges = histogram.edges
+        cumulative_counts = histogram.underflow + np.concatenate([[0], np.cumsum(histogram.counts)])
+
+        inside = (x >= edges[0]) & (x < edges[-1])
+        indices = np.clip(np.searchsorted(edges, x, side='right'), 1, len(histogram.counts))
+        bounded = np.clip(self.sketch.cdf(x),
+                          cumulative_counts[indices - 1] / self.count, cumulative_counts[indices] / self.count)
+
+        return np.where(inside, bounded, self.sketch.cdf(x))
+
+    def histogram(self):
+        """
+        Return the histogram like numpy.histogram: the counts per bin and the bin edges.
+        Values outside the bins are left out (see histogram_counts.underflow and overflow).
+        """
+
+        return self.histogram_counts.counts.copy(), self.histogram_counts.edges.copy()
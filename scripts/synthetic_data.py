@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from samplers import daily_production
+from simulate import segment_parameters
+
+# Folder with the fitted segment values of the locations (<location>.json, see calculate_and_save_segments_values)
+FITTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'output')
+
+# Locations whose fitted segment values the synthetic data is generated with by default
+FITTED_LOCATIONS = ['BRU', 'STO']
+
+
+def fitted_parameters(locations=FITTED_LOCATIONS, directory=FITTED_DIR):
+    """
+    Load the fitted segment values of locations from their <location>.json files.
+
+    Parameters:
+        locations (iterable): The locations. Default is FITTED_LOCATIONS (BRU and STO).
+        directory (str): The folder with the files. Default is FITTED_DIR (data/output).
+
+    Returns:
+        dict: The segment values per location.
+    """
+
+    parameters = {}
+    for location in locations:
+        filename = os.path.join(directory, f'{location}.json')
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"No fitted segment values for location '{location}': {filename} does not "
+                                    f"exist. Run calculate_and_save_segments_values or pass the parameters.")
+        with open(filename, 'r') as json_file:
+            parameters[location] = json.load(json_file)[location]
+
+    return parameters
+
+
+# Share of days with maintenance (about 208 of the 3660 days in the real data)
+MAINTENANCE_SHARE = 0.057
+
+
+def capacity(params):
+    """
+    Daily production capacity of a location: production + prod_loss is the same every day.
+    It is set to the mean of segment 3 plus three standard deviations.
+    """
+
+    return int(np.ceil(params['param1_s3'] + 3 * params['param2_s3']))
+
+
+def scale_parameters(parameters, n_locations):
+    """
+    Make segment values for n_locations locations by repeating the given locations.
+
+    Parameters:
+        parameters (dict): Segment values per location.
+        n_locations (int): Number of locations.
+
+    Returns:
+        dict: The segment values per location, named like 'BRU000', 'STO001', 'BRU002', ...
+    """
+
+    locations = list(parameters)
+
+    return {f'{locations[i % len(locations)]}{i:03d}': parameters[locations[i % len(locations)]]
+            for i in range(n_locations)}
+
+
+def generate_daily_production(output_dir, parameters=None, years=1, start_date='2018-01-01',
+                              maintenance_share=MAINTENANCE_SHARE, seed=None):
+    """
+    Write a synthetic daily production data set: one folder per location with one YYYYMMDD.json file per day.
+
+    Parameters:
+        output_dir (str): The folder to write the location folders to (like data/input/data_production/daily_production).
+        parameters (dict or None): Segment values per location, e.g. the parameter store.
+                                   Default is None (the fitted values of FITTED_LOCATIONS, see fitted_parameters).
+        years (int): Number of years of data per location.
+        start_date (str): The first day.
+        maintenance_share (float): Share of days with maintenance.
+        seed (int or None): Seed of the random numbers. Default is None (random data).
+
+    Returns:
+        dict: The folder of every location (the directories argument of read_files.read_locations).
+
+    The files have the fields of the real data (DoW, hour, minute, date, maintenance, prod_loss, prod_loss_perc,
+    production). The production of every day is drawn from the three-segment mixture of its location and rounded,
+    prod_loss is the rest of the daily capacity. On maintenance days the production columns are not numeric.
+    """
+
+    parameters = fitted_parameters() if parameters is None else parameters
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=int(round(365.25 * years)), freq='D')
+
+    directories = {}
+    for location, params in parameters.items():
+        location_capacity = capacity(params)
+        production = daily_production(rng.random(len(dates)), *segment_parameters(params))
+        production = np.clip(np.round(production), 0, location_capacity).astype(int)
+        maintenance = rng.random(len(dates)) < maintenance_share
+
+        directory = os.path.join(output_dir, location)
+        os.makedirs(directory, exist_ok=True)
+        for date, value, in_maintenance in zip(dates, production, maintenance):
+            record = {
+                'DoW': date.day_name(),
+                'hour': 1,
+                'minute': 0,
+                'date': date.strftime('%m-%d-%Y 00:00:00.0000'),
+                'maintenance': 'Yes' if in_maintenance else 'No',
+                'prod_loss': '-' if in_maintenance else int(location_capacity - value),
+                'prod_loss_perc': '-' if in_maintenance else round(100 * (location_capacity - value)
+                                                                   / location_capacity),
+                'production': '-' if in_maintenance else int(value)
+            }
+            with open(os.path.join(directory, f'{date:%Y%m%d}.json'), 'w') as json_file:
+                json.dump(record, json_file)
+        directories[location] = directory
+
+    return directories
@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from segment_calculations import (calculate_segments_values_from_statistics, create_segment_statistics,
+                                  refresh_segments_values, update_segment_statistics)
+from summaries import RunningMoments
+
+
+def round_trip(state):
+    # allow_nan=False raises on NaN and Infinity, which are not standard JSON
+    return json.loads(json.dumps(state, allow_nan=False))
+
+
+def test_empty_moments_round_trip():
+    moments = RunningMoments.from_dict(round_trip(RunningMoments().to_dict()))
+    moments.update([3.0, 1.0, 2.0])
+
+    assert (moments.count, moments.mean, moments.minimum, moments.maximum) == (3, 2.0, 1.0, 3.0)
+
+
+def test_statistics_round_trip_with_empty_segment():
+    statistics = round_trip(create_segment_statistics('BRU', 10**(-8), 750))
+    update_segment_statistics(statistics, 'BRU', [0.0, 800.0, 900.0, np.nan])
+    statistics = round_trip(statistics)
+
+    results = round_trip(calculate_segments_values_from_statistics(statistics, 'BRU'))['BRU']
+    assert results['lower_bound_s2'] is None and results['upper_bound_s2'] is None
+    assert results['param1_s3'] == 850.0
+
+    update_segment_statistics(statistics, 'BRU', [400.0, 500.0])
+    results = calculate_segments_values_from_statistics(round_trip(statistics), 'BRU')['BRU']
+    assert (results['lower_bound_s2'], results['upper_bound_s2']) == (400.0, 500.0)
+
+
+def test_refresh_writes_standard_json(tmp_path):
+    statistics_filename = tmp_path / 'statistics.json'
+    statistics_filename.write_text(json.dumps(create_segment_statistics('STO', 10**(-8), 150)))
+
+    refresh_segments_values('STO', [200.0, 210.0], statistics_filename, tmp_path / 'STO.json')
+
+    for filename in (statistics_filename, tmp_path / 'STO.json'):
+        text = filename.read_text()
+        assert 'NaN' not in text and 'Infinity' not in text
+
+
+def test_statistics_without_days():
+    results = calculate_segments_values_from_statistics(create_segment_statistics('BRU', 10**(-8), 750), 'BRU')
+
+    assert round_trip(results)['BRU']['share_1'] is None